@@ -7,9 +7,34 @@ from config import Config
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+
+    from app.serializacion import proveedor_json
+    app.json = proveedor_json(app)
     
     from app.models import db
     db.init_app(app)
+
+    from app.pool import instrumentar_pool
+    with app.app_context():
+        app.extensions['pool_metricas'] = instrumentar_pool(db.engine)
+
+    from app.cache import cache
+    cache.init_app(app)
+
+    from app.autocompletar import autocompletar
+    autocompletar.init_app(app)
+
+    from app.disponibilidad import disponibilidad
+    disponibilidad.init_app(app)
+
+    from app.metricas import metricas
+    metricas.init_app(app)
+
+    from app.presupuesto import presupuesto_consultas
+    presupuesto_consultas.init_app(app)
+
+    from app.commit_agrupado import commit_agrupado
+    commit_agrupado.init_app(app)
     
     CORS(app, resources={r"/*": {"origins": "*"}})
     Migrate(app, db)
@@ -17,5 +42,8 @@ def create_app(config_class=Config):
     
     from app.routes import main_bp
     app.register_blueprint(main_bp)
+
+    from app.cli import registrar_comandos
+    registrar_comandos(app)
     
     return app
\ No newline at end of file
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, false, insert, select, union_all
+
+from app.models import db, Usuario, Libro, Prestamo, PrestamoArchivado
+
+# Separación de préstamos calientes y fríos: los devueltos hace más de ARCHIVO_DIAS se mueven
+# a prestamos_archivados. Las rutas de préstamos (listado, checkout, devolución, vencidos) solo
+# recorren prestamos, que queda con los activos y el historial reciente; el historial completo
+# se lee con ?incluir_historial=1, uniendo las dos tablas.
+
+COLUMNAS_ARCHIVADAS = ('id', 'usuario_id', 'libro_id', 'fecha_prestamo', 'fecha_vencimiento', 'fecha_devolucion')
+
+
+def archivar(dias, lote, ahora=None):
+    """Mueve los préstamos devueltos antes de ahora - dias, de a lote filas por transacción; devuelve cuántos movió"""
+    corte = (ahora or datetime.utcnow()) - timedelta(days=dias)
+    columnas = [getattr(Prestamo, columna) for columna in COLUMNAS_ARCHIVADAS]
+    movidos = 0
+    while True:
+        # Transacciones cortas: cada lote bloquea pocas filas y no infla el WAL con una sola transacción enorme
+        ids = db.session.scalars(
+            select(Prestamo.id)
+            .where(Prestamo.activo == False, Prestamo.fecha_devolucion < corte)
+            .order_by(Prestamo.id)
+            .limit(lote)
+        ).all()
+        if not ids:
+            return movidos
+        db.session.execute(insert(PrestamoArchivado).from_select(
+            list(COLUMNAS_ARCHIVADAS), select(*columnas).where(Prestamo.id.in_(ids))
+        ))
+        db.session.execute(delete(Prestamo).where(Prestamo.id.in_(ids)).execution_options(synchronize_session=False))
+        db.session.commit()
+        movidos += len(ids)
+
+
+def prestamos_con_historial(id=None, after=None, limit=None):
+    """Subconsulta (UNION ALL) con los préstamos de las dos tablas y las columnas de Prestamo.
+
+    El filtro por id, el keyset (id > after) y el límite se aplican dentro de cada tabla: cada lado lee
+    a lo sumo una página por su llave primaria y la unión nunca se materializa completa.
+    """
+    partes = []
+    for modelo, activo in ((Prestamo, Prestamo.activo), (PrestamoArchivado, false().label('activo'))):
+        parte = select(*[getattr(modelo, columna) for columna in COLUMNAS_ARCHIVADAS], activo)
+        if id is not None:
+            parte = parte.where(modelo.id == id)
+        if after is not None:
+            parte = parte.where(modelo.id > after)
+        if limit is not None:
+            parte = parte.order_by(modelo.id).limit(limit)
+        partes.append(select(*parte.subquery().c)) # SQLite no admite ORDER BY/LIMIT en una parte del UNION sin envolverla
+    return union_all(*partes).subquery('prestamos_con_historial')
+
+
+def consulta_con_historial(campos, id=None, after=None, limit=None):
+    """select() de los campos pedidos (claves de COLUMNAS[Prestamo]) de los préstamos de las dos tablas, por id.
+
+    El id va como última columna de cada fila (para el cursor de paginación).
+    """
+    todos = prestamos_con_historial(id, after, limit)
+    columnas = dict(todos.c.items(), usuario_nombre=Usuario.nombre, libro_titulo=Libro.titulo)
+    consulta = select(*[columnas[campo] for campo in campos], todos.c.id).select_from(todos).order_by(todos.c.id)
+    if 'usuario_nombre' in campos:
+        consulta = consulta.join(Usuario, Usuario.id == todos.c.usuario_id)
+    if 'libro_titulo' in campos:
+        consulta = consulta.join(Libro, Libro.id == todos.c.libro_id)
+    return consulta if limit is None else consulta.limit(limit)
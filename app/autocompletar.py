@@ -0,0 +1,174 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from app.models import db, Libro
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para que 'garcia' encuentre 'García'"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+class IndicePrefijos:
+    """Arreglos ordenados por clave normalizada; la búsqueda por prefijo es un bisect + recorrido.
+
+    Con unico=True cada texto aparece una sola vez aunque lo tengan varios libros
+    (autores): se lleva la cuenta de cuántos libros lo usan.
+
+    Las rutas lo modifican mientras otros hilos buscan: agregar, quitar y buscar
+    se serializan con un lock propio del índice.
+    """
+
+    def __init__(self, entradas=(), unico=False):
+        # entradas: pares (texto, libro_id)
+        self.unico = unico
+        self.conteo = {}
+        self._lock = threading.Lock()
+        filas = []
+        for texto, libro_id in entradas:
+            clave = normalizar(texto)
+            if unico:
+                self.conteo[clave] = self.conteo.get(clave, 0) + 1
+                if self.conteo[clave] > 1:
+                    continue
+            filas.append((clave, libro_id, texto))
+        filas.sort()
+        self.entradas = filas
+
+    def agregar(self, texto, libro_id):
+        clave = normalizar(texto)
+        with self._lock:
+            self._agregar(clave, texto, libro_id)
+
+    def _agregar(self, clave, texto, libro_id):
+        if self.unico:
+            self.conteo[clave] = self.conteo.get(clave, 0) + 1
+            if self.conteo[clave] > 1:
+                return
+        insort(self.entradas, (clave, libro_id, texto))
+
+    def quitar(self, texto, libro_id):
+        clave = normalizar(texto)
+        with self._lock:
+            self._quitar(clave, libro_id)
+
+    def _quitar(self, clave, libro_id):
+        if self.unico:
+            self.conteo[clave] = self.conteo.get(clave, 0) - 1
+            if self.conteo[clave] > 0:
+                return
+            del self.conteo[clave]
+            i = bisect_left(self.entradas, (clave,))
+            if i < len(self.entradas) and self.entradas[i][0] == clave:
+                del self.entradas[i]
+            return
+        i = bisect_left(self.entradas, (clave, libro_id))
+        if i < len(self.entradas) and self.entradas[i][:2] == (clave, libro_id):
+            del self.entradas[i]
+
+    def buscar(self, prefijo, limit):
+        clave = normalizar(prefijo)
+        with self._lock:
+            i = bisect_left(self.entradas, (clave,))
+            resultados = []
+            while i < len(self.entradas) and len(resultados) < limit and self.entradas[i][0].startswith(clave):
+                resultados.append(self.entradas[i])
+                i += 1
+        return resultados
+
+    def __len__(self):
+        return len(self.entradas)
+
+
+class Autocompletar:
+    """Índice de prefijos en memoria del proceso sobre Libro.titulo y Libro.autor.
+
+    Las rutas de libros lo actualizan de forma incremental. Como cada worker tiene
+    su propia copia, si la versión del catálogo (la misma de app/cache.py) cambió
+    por escrituras de otros procesos, se reconstruye como máximo cada
+    AUTOCOMPLETAR_REFRESCO segundos.
+    """
+
+    def init_app(self, app):
+        app.extensions['autocompletar'] = {'titulos': None, 'autores': None, 'version': None, 'construido_en': 0.0}
+        app.extensions['autocompletar_lock'] = threading.Lock()
+
+    @property
+    def estado(self):
+        return current_app.extensions['autocompletar']
+
+    def construir(self):
+        from app.cache import cache
+        version = cache.version('libros')
+        # Solo las dos columnas necesarias, sin crear objetos Libro
+        filas = db.session.execute(db.select(Libro.id, Libro.titulo, Libro.autor)).all()
+        self.estado.update({
+            'titulos': IndicePrefijos((titulo, id) for id, titulo, _ in filas),
+            'autores': IndicePrefijos(((autor, id) for id, _, autor in filas), unico=True),
+            'version': version,
+            'construido_en': time.monotonic(),
+        })
+
+    def _vigente(self):
+        from app.cache import cache
+        estado = self.estado
+        if estado['titulos'] is None:
+            vencido = True
+        else:
+            refresco = current_app.config.get('AUTOCOMPLETAR_REFRESCO', 60)
+            version = cache.version('libros')
+            # Sin versión (backend caído) no se sabe si hubo escrituras: se reconstruye cada REFRESCO
+            vencido = (time.monotonic() - estado['construido_en'] >= refresco
+                       and (version is None or version != estado['version']))
+        if vencido:
+            lock = current_app.extensions['autocompletar_lock']
+            if estado['titulos'] is None:
+                # Primera construcción: la petición espera a que termine
+                with lock:
+                    if estado['titulos'] is None:
+                        self.construir()
+            elif lock.acquire(blocking=False):
+                # Refresco: se reconstruye en otro hilo y mientras tanto se sigue usando el índice anterior
+                self._reconstruir_en_segundo_plano(current_app._get_current_object(), lock)
+        return estado
+
+    def _reconstruir_en_segundo_plano(self, app, lock):
+        def tarea():
+            try:
+                with app.app_context():
+                    self.construir()
+            finally:
+                lock.release()
+        threading.Thread(target=tarea, daemon=True).start()
+
+    def reiniciar(self):
+        """Descarta el índice; se construye de nuevo en la siguiente búsqueda"""
+        self.estado['titulos'] = None
+
+    def buscar(self, prefijo, limit):
+        estado = self._vigente()
+        sugerencias = [{'texto': texto, 'campo': 'titulo', 'id': id}
+                       for _, id, texto in estado['titulos'].buscar(prefijo, limit)]
+        sugerencias += [{'texto': texto, 'campo': 'autor'}
+                        for _, _, texto in estado['autores'].buscar(prefijo, limit)]
+        return sorted(sugerencias, key=lambda s: normalizar(s['texto']))[:limit]
+
+    def agregar(self, libro_id, titulo, autor):
+        estado = self.estado
+        if estado['titulos'] is not None: # Si aún no se construyó, se construirá completo en la primera búsqueda
+            estado['titulos'].agregar(titulo, libro_id)
+            estado['autores'].agregar(autor, libro_id)
+
+    def quitar(self, libro_id, titulo, autor):
+        estado = self.estado
+        if estado['titulos'] is not None:
+            estado['titulos'].quitar(titulo, libro_id)
+            estado['autores'].quitar(autor, libro_id)
+
+
+autocompletar = Autocompletar()
@@ -0,0 +1,73 @@
+import re
+
+from sqlalchemy import DDL, column, event, false, func, literal_column, or_, select, table, text
+
+from app.models import db, Libro
+
+# Búsqueda de texto completo sobre Libro.titulo y Libro.autor.
+# - PostgreSQL: columna generada libros.busqueda (tsvector, título con más peso que autor) con índice GIN.
+# - SQLite: tabla virtual FTS5 libros_fts sincronizada por triggers.
+# En ambos casos la base de datos mantiene el índice al crear, actualizar o eliminar libros
+# (también en las creaciones en lote y en los borrados masivos), sin código extra en las rutas.
+
+DDL_POSTGRESQL = [
+    """ALTER TABLE libros ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(autor, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_libros_busqueda ON libros USING GIN (busqueda)",
+]
+
+DDL_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS libros_fts USING fts5(titulo, autor, tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS libros_fts_ai AFTER INSERT ON libros BEGIN
+        INSERT INTO libros_fts(rowid, titulo, autor) VALUES (new.id, new.titulo, new.autor);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS libros_fts_au AFTER UPDATE OF titulo, autor ON libros BEGIN
+        UPDATE libros_fts SET titulo = new.titulo, autor = new.autor WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS libros_fts_ad AFTER DELETE ON libros BEGIN
+        DELETE FROM libros_fts WHERE rowid = old.id;
+    END""",
+]
+
+# Para bases creadas con db.create_all() (las migradas lo hacen en migrations/versions/0003, con su propia copia del DDL)
+for sentencia in DDL_POSTGRESQL:
+    event.listen(Libro.__table__, 'after_create', DDL(sentencia).execute_if(dialect='postgresql'))
+for sentencia in DDL_SQLITE:
+    event.listen(Libro.__table__, 'after_create', DDL(sentencia).execute_if(dialect='sqlite'))
+event.listen(Libro.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS libros_fts').execute_if(dialect='sqlite'))
+
+libros_fts = table('libros_fts', column('rowid'))
+
+
+def consulta_busqueda(q, limit):
+    """select(Libro) con los libros que coinciden con q, del más relevante al menos relevante"""
+    dialecto = db.engine.dialect.name
+
+    if dialecto == 'postgresql':
+        consulta = func.websearch_to_tsquery('simple', q) # Acepta texto libre del usuario sin errores de sintaxis
+        vector = literal_column('libros.busqueda')
+        return (select(Libro)
+                .where(vector.op('@@')(consulta))
+                .order_by(func.ts_rank(vector, consulta).desc(), Libro.id)
+                .limit(limit))
+
+    palabras = re.findall(r'\w+', q)
+    if not palabras:
+        return select(Libro).where(false())
+
+    if dialecto == 'sqlite':
+        # Cada palabra entre comillas (sin operadores FTS5) y como prefijo: "cien"* "años"*
+        expresion = ' '.join(f'"{palabra}"*' for palabra in palabras)
+        return (select(Libro)
+                .join(libros_fts, libros_fts.c.rowid == Libro.id)
+                .where(text('libros_fts MATCH :expresion').bindparams(expresion=expresion))
+                .order_by(text('bm25(libros_fts, 2.0, 1.0)'), Libro.id) # El título pesa el doble que el autor
+                .limit(limit))
+
+    # Otros motores: sin índice de texto, coincidencia simple por palabra
+    return (select(Libro)
+            .where(*[or_(Libro.titulo.ilike(f'%{p}%'), Libro.autor.ilike(f'%{p}%')) for p in palabras])
+            .order_by(Libro.id)
+            .limit(limit))
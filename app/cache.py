@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+logger = logging.getLogger(__name__)
+
+
+# ============= BACKENDS =============
+
+class MemoriaBackend:
+    """Backend en memoria del proceso, para pruebas o cuando no hay servidor Redis"""
+
+    def __init__(self):
+        self._datos = {} # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expira_en, valor = entrada
+            if expira_en is not None and expira_en < time.monotonic():
+                del self._datos[clave]
+                return None
+            return valor
+
+    def add(self, clave, valor):
+        # Solo guarda si la clave no existe (como SET NX)
+        with self._lock:
+            self._datos.setdefault(clave, (None, valor))
+
+    def set(self, clave, valor, ttl):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl if ttl else None, valor)
+
+    def incr(self, clave):
+        with self._lock:
+            _, valor = self._datos.get(clave, (None, 0))
+            valor = int(valor) + 1
+            self._datos[clave] = (None, valor)
+            return valor
+
+
+class RedisBackend:
+    """Backend sobre Redis, compartido entre workers y contenedores"""
+
+    def __init__(self, url):
+        import redis # Se importa aquí para que el backend en memoria no dependa de redis
+        self._redis = redis.Redis.from_url(url)
+        self._errores = redis.exceptions.RedisError
+
+    def get(self, clave):
+        try:
+            return self._redis.get(clave)
+        except self._errores:
+            logger.warning('Redis no disponible, se ignora la cache', exc_info=True)
+            return None
+
+    def add(self, clave, valor):
+        try:
+            self._redis.set(clave, valor, nx=True)
+        except self._errores:
+            logger.warning('Redis no disponible, no se guardó %s', clave, exc_info=True)
+
+    def set(self, clave, valor, ttl):
+        try:
+            self._redis.set(clave, valor, ex=ttl or None)
+        except self._errores:
+            logger.warning('Redis no disponible, no se guardó %s', clave, exc_info=True)
+
+    def incr(self, clave):
+        try:
+            return self._redis.incr(clave)
+        except self._errores:
+            logger.warning('Redis no disponible, no se invalidó %s', clave, exc_info=True)
+            return None
+
+
+# ============= CACHE DE RESPUESTAS =============
+
+class Cache:
+    """Cache read-through de respuestas JSON con invalidación por versión.
+
+    Cada namespace (p. ej. 'libros') tiene un contador de versión que forma parte
+    de la clave; las escrituras lo incrementan y las entradas viejas dejan de
+    usarse y expiran solas por TTL. La misma versión sirve de ETag para los GET
+    condicionales.
+    """
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memoria')
+        if backend == 'redis':
+            app.extensions['cache'] = RedisBackend(app.config['REDIS_URL'])
+        else:
+            app.extensions['cache'] = MemoriaBackend()
+        app.extensions['cache_stats'] = {'hits': 0, 'misses': 0}
+        app.extensions['cache_stats_lock'] = threading.Lock()
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    @property
+    def estadisticas(self):
+        return current_app.extensions['cache_stats']
+
+    def _contar(self, clave):
+        # Con gthread varios hilos atienden peticiones a la vez: += sobre el dict no es atómico
+        with current_app.extensions['cache_stats_lock']:
+            current_app.extensions['cache_stats'][clave] += 1
+
+    def version(self, namespace):
+        """Versión actual del namespace, o None si no se puede leer (p. ej. Redis caído)"""
+        clave = f'{namespace}:version'
+        valor = self.backend.get(clave)
+        if valor is None:
+            # Arranca en la hora actual y no en 0, para que un reinicio del backend
+            # no repita versiones (y ETags) que los clientes ya tienen guardadas
+            self.backend.add(clave, int(time.time() * 1000))
+            valor = self.backend.get(clave)
+        # Sin versión no se puede saber si hubo escrituras: quien llama no debe confiar en nada guardado
+        return None if valor is None else int(valor)
+
+    def invalidar(self, *namespaces):
+        """Incrementa la versión de cada namespace y devuelve {namespace: versión nueva}"""
+        versiones = {}
+        for namespace in namespaces:
+            clave = f'{namespace}:version'
+            # Como en version(): si la clave no existe (backend reiniciado o vaciado) se siembra con la hora
+            # actual antes de incrementar; un INCR sobre una clave inexistente volvería a 1, 2, ... y repetiría ETags
+            self.backend.add(clave, int(time.time() * 1000))
+            versiones[namespace] = self.backend.incr(clave)
+        return versiones
+
+    def cacheado(self, namespace):
+        """Decorador para vistas GET: guarda el cuerpo de las respuestas 200"""
+        def decorador(vista):
+            @wraps(vista)
+            def envoltura(*args, **kwargs):
+                # Las respuestas en streaming (?stream=1 o NDJSON) no se materializan, así que no se guardan
+                ndjson = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+                if 'stream' in request.args or ndjson:
+                    return vista(*args, **kwargs)
+
+                version = self.version(namespace)
+                if version is None:
+                    return vista(*args, **kwargs) # Sin versión no hay clave válida: se responde sin cache
+                clave = f'{namespace}:v{version}:{request.full_path}'
+                cuerpo = self.backend.get(clave)
+                if cuerpo is not None:
+                    self._contar('hits')
+                    respuesta = make_response(cuerpo)
+                    respuesta.mimetype = 'application/json'
+                    return respuesta
+
+                self._contar('misses')
+                respuesta = make_response(vista(*args, **kwargs))
+                if respuesta.status_code == 200 and not respuesta.is_streamed:
+                    self.backend.set(clave, respuesta.get_data(), current_app.config.get('CACHE_TTL', 60))
+                return respuesta
+            return envoltura
+        return decorador
+
+    def condicional(self, namespace):
+        """Decorador para vistas GET: ETag según la versión del recurso y 304 si no cambió"""
+        def decorador(vista):
+            @wraps(vista)
+            def envoltura(*args, **kwargs):
+                # La versión se lee antes de consultar: si hay una escritura en medio, el
+                # cliente recibe un ETag viejo y en la siguiente petición obtiene un 200 (nunca datos viejos)
+                version = self.version(namespace)
+                if version is None:
+                    return vista(*args, **kwargs) # Sin versión no hay ETag confiable: 200 normal, sin 304
+                etag = f'{namespace}-{version}'
+                if request.if_none_match.contains(etag):
+                    respuesta = make_response('', 304) # Sin tocar la base de datos
+                else:
+                    respuesta = make_response(vista(*args, **kwargs))
+                    if respuesta.status_code != 200:
+                        return respuesta
+                respuesta.set_etag(etag)
+                respuesta.headers['Cache-Control'] = 'no-cache' # El navegador siempre revalida con If-None-Match
+                respuesta.vary.add('Accept')
+                return respuesta
+            return envoltura
+        return decorador
+
+
+cache = Cache()
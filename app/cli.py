@@ -0,0 +1,58 @@
+import click
+from sqlalchemy import func, select, update
+
+from app.models import db, Usuario, Libro, Prestamo, PrestamoArchivado
+
+
+def reconciliar_contadores():
+    """Recalcula prestamos_activos y total_prestamos desde prestamos (y los archivados); devuelve cuántas filas corrigió por tabla"""
+    corregidos = {}
+    for modelo, llave in ((Usuario, 'usuario_id'), (Libro, 'libro_id')):
+        # Subconsultas correlacionadas (usan los índices de usuario_id / libro_id de cada tabla);
+        # solo se escriben las filas desfasadas
+        def contar(tabla, *condiciones):
+            return select(func.count()).where(getattr(tabla, llave) == modelo.id, *condiciones).scalar_subquery()
+        activos = contar(Prestamo, Prestamo.activo == True)
+        total = contar(Prestamo) + contar(PrestamoArchivado) # Los archivados siguen contando en el total
+        resultado = db.session.execute(
+            update(modelo)
+            .where((modelo.prestamos_activos != activos) | (modelo.total_prestamos != total))
+            .values(prestamos_activos=activos, total_prestamos=total)
+            .execution_options(synchronize_session=False)
+        )
+        corregidos[modelo.__tablename__] = resultado.rowcount
+    db.session.commit()
+    return corregidos
+
+
+def registrar_comandos(app):
+    # Comandos de mantenimiento: se ejecutan con `flask --app run <comando>`, fuera del servidor
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Crea las tablas que no existan (para bases nuevas; en las existentes usar `flask db upgrade`)"""
+        db.create_all()
+        click.echo('Base de datos inicializada')
+
+    @app.cli.command('archivar-prestamos')
+    @click.option('--dias', type=int, default=None, help='Antigüedad mínima de la devolución (por defecto ARCHIVO_DIAS)')
+    @click.option('--lote', type=int, default=None, help='Filas por transacción (por defecto ARCHIVO_LOTE)')
+    def archivar_prestamos(dias, lote):
+        """Mueve a prestamos_archivados los préstamos devueltos hace más de --dias días"""
+        from app.archivo import archivar
+        from app.cache import cache
+        dias = app.config['ARCHIVO_DIAS'] if dias is None else dias
+        movidos = archivar(dias, lote or app.config['ARCHIVO_LOTE'])
+        if movidos:
+            cache.invalidar('prestamos') # GET /prestamos sin historial ya no los muestra
+        click.echo(f'{movidos} préstamos archivados (devueltos hace más de {dias} días)')
+
+    @app.cli.command('reconciliar-contadores')
+    def reconciliar():
+        """Corrige los contadores de préstamos de usuarios y libros que no coincidan con la tabla prestamos"""
+        from app.cache import cache
+        corregidos = reconciliar_contadores()
+        if any(corregidos.values()):
+            cache.invalidar('usuarios', 'libros')
+        for tabla, filas in corregidos.items():
+            click.echo(f'{tabla}: {filas} filas corregidas')
@@ -0,0 +1,177 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.models import db
+
+logger = logging.getLogger(__name__)
+
+
+class Trabajo:
+    def __init__(self, funcion):
+        self.funcion = funcion
+        self.resultado = None
+        self.error = None
+        self.listo = threading.Event()
+        self.estado = 'pendiente' # 'en_lote' (lo tomó el Agrupador) o 'cancelado' (la petición dejó de esperar)
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        """El Agrupador lo va a ejecutar; False si la petición ya lo canceló"""
+        with self._lock:
+            if self.estado == 'pendiente':
+                self.estado = 'en_lote'
+            return self.estado == 'en_lote'
+
+    def cancelar(self):
+        """La petición deja de esperar; False si ya está en un lote (su resultado llega con ese COMMIT)"""
+        with self._lock:
+            if self.estado == 'pendiente':
+                self.estado = 'cancelado'
+            return self.estado == 'cancelado'
+
+
+class Rechazo(Exception):
+    """El trabajo respondió con un error (status >= 400): se deshace su savepoint, no el lote"""
+
+    def __init__(self, resultado):
+        self.resultado = resultado
+
+
+class Agrupador:
+    """Hilo de un worker que confirma en una sola transacción las escrituras de varias peticiones.
+
+    Cada petición encola su trabajo y espera. El hilo junta los trabajos que llegan durante
+    COMMIT_AGRUPADO_ESPERA_MS (o hasta COMMIT_AGRUPADO_MAXIMO), ejecuta cada uno dentro de su propio
+    SAVEPOINT y hace un solo COMMIT: un fsync para todo el lote en lugar de uno por petición.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cola = queue.Queue()
+        self.pid = None
+        self.lock = threading.Lock()
+        self.lotes = 0
+        self.trabajos = 0
+
+    def enviar(self, funcion):
+        # El hilo se crea en el primer uso de cada proceso: con preload_app el maestro de gunicorn
+        # crea la app antes del fork y los hilos no sobreviven al fork
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.cola = queue.Queue()
+                    threading.Thread(target=self._bucle, name='commit-agrupado', daemon=True).start()
+                    self.pid = os.getpid()
+        trabajo = Trabajo(funcion)
+        self.cola.put(trabajo)
+        espera = self.app.config.get('COMMIT_AGRUPADO_TIMEOUT', 30)
+        if not trabajo.listo.wait(espera):
+            if trabajo.cancelar():
+                return {'error': 'El commit agrupado no respondió a tiempo; no se aplicó ningún cambio, reintente'}, 503
+            if not trabajo.listo.wait(espera):
+                return {'error': 'El commit agrupado no respondió a tiempo; no se sabe si el cambio se aplicó'}, 504
+        if trabajo.error is not None:
+            raise trabajo.error
+        return trabajo.resultado
+
+    def _bucle(self):
+        with self.app.app_context(): # db.session de este hilo: una sesión propia, distinta a la de las peticiones
+            while True:
+                lote = [self.cola.get()]
+                limite = time.perf_counter() + self.app.config.get('COMMIT_AGRUPADO_ESPERA_MS', 2) / 1000
+                maximo = self.app.config.get('COMMIT_AGRUPADO_MAXIMO', 64)
+                while len(lote) < maximo:
+                    restante = limite - time.perf_counter()
+                    try:
+                        lote.append(self.cola.get(timeout=restante) if restante > 0 else self.cola.get_nowait())
+                    except queue.Empty:
+                        break
+                lote = [trabajo for trabajo in lote if trabajo.tomar()]
+                if not lote:
+                    continue
+                try:
+                    self._confirmar(lote)
+                except Exception as error:
+                    # El hilo no puede terminar: las peticiones siguientes del worker esperarían en vano
+                    logger.exception('Falló el commit agrupado de un lote de %s trabajos', len(lote))
+                    db.session.remove()
+                    for trabajo in lote:
+                        if not trabajo.listo.is_set():
+                            trabajo.error = trabajo.error or error
+                            trabajo.listo.set()
+
+    def _confirmar(self, lote):
+        try:
+            if db.engine.dialect.name == 'sqlite':
+                # SQLite: tomar el lock de escritura al empezar. Si no, el SELECT de un trabajo deja un lock
+                # compartido y la primera escritura falla con "database is locked" cuando otra conexión ya
+                # espera para escribir (SQLite lo detecta como deadlock y no aplica el busy timeout)
+                db.session.execute(text('BEGIN IMMEDIATE'))
+            for trabajo in lote:
+                try:
+                    with db.session.begin_nested():
+                        resultado = trabajo.funcion()
+                        if resultado[1] >= 400:
+                            raise Rechazo(resultado)
+                    trabajo.resultado = resultado
+                except Rechazo as rechazo:
+                    trabajo.resultado = rechazo.resultado
+                except Exception as error:
+                    trabajo.error = error
+            db.session.commit()
+        except Exception as error:
+            # Si falla el COMMIT, el BEGIN o la conexión, ninguna escritura del lote quedó confirmada
+            # (los trabajos sin resultado ni siquiera llegaron a ejecutarse)
+            db.session.rollback()
+            for trabajo in lote:
+                if trabajo.error is None and (trabajo.resultado is None or trabajo.resultado[1] < 400):
+                    trabajo.error = error
+        finally:
+            self.lotes += 1
+            self.trabajos += len(lote)
+            for trabajo in lote:
+                trabajo.listo.set()
+            db.session.close()
+
+
+class CommitAgrupado:
+    """Confirma las escrituras de POST /usuarios y POST /prestamos (ver ejecutar).
+
+    Con COMMIT_AGRUPADO=false (por defecto) cada petición hace su propio commit, como siempre;
+    con true, las peticiones concurrentes de un worker comparten el commit del Agrupador.
+    """
+
+    def init_app(self, app):
+        app.extensions['commit_agrupado'] = Agrupador(app)
+
+    def ejecutar(self, funcion):
+        """Ejecuta funcion() (sentencias sin commit que devuelven (cuerpo, status)) y la confirma si status < 400.
+
+        El resultado (o la excepción) es siempre el de esta petición, aunque el commit sea compartido.
+        Las acciones posteriores al commit (invalidar la cache, etc.) quedan a cargo de la ruta.
+        """
+        if current_app.config.get('COMMIT_AGRUPADO'):
+            return current_app.extensions['commit_agrupado'].enviar(funcion)
+        try:
+            resultado = funcion()
+        except Exception:
+            db.session.rollback()
+            raise
+        if resultado[1] >= 400:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        return resultado
+
+    def estadisticas(self):
+        agrupador = current_app.extensions['commit_agrupado']
+        return {'lotes': agrupador.lotes, 'trabajos': agrupador.trabajos}
+
+
+commit_agrupado = CommitAgrupado()
@@ -0,0 +1,129 @@
+import threading
+
+from flask import current_app
+
+from app.models import db, Libro
+
+
+class MapaBits:
+    """Conjunto de enteros no negativos en un bytearray: 1 bit por id (10M ids ≈ 1.2 MB)"""
+
+    def __init__(self):
+        self.bytes = bytearray()
+        self.total = 0 # Cantidad de bits encendidos, para contar en O(1)
+
+    def __contains__(self, i):
+        byte = i >> 3
+        return byte < len(self.bytes) and bool(self.bytes[byte] & (1 << (i & 7)))
+
+    def poner(self, i, valor):
+        byte, mascara = i >> 3, 1 << (i & 7)
+        if byte >= len(self.bytes):
+            if not valor:
+                return
+            self.bytes.extend(bytes(byte - len(self.bytes) + 1 + len(self.bytes) // 2)) # Crece con holgura
+        if bool(self.bytes[byte] & mascara) != valor:
+            self.bytes[byte] ^= mascara
+            self.total += 1 if valor else -1
+
+    def __len__(self):
+        return self.total
+
+
+class Disponibilidad:
+    """Copia en memoria del proceso de Libro.disponible (y de qué ids existen).
+
+    Las rutas de libros y préstamos la actualizan al escribir. Solo se confía en ella
+    cuando su versión coincide con la versión compartida del catálogo (app/cache.py):
+    si otro proceso escribió (o la versión no se puede leer) se responde desde la base de
+    datos mientras otro hilo la reconcilia.
+    """
+
+    def init_app(self, app):
+        app.extensions['disponibilidad'] = {'disponibles': None, 'existentes': None, 'version': None}
+        app.extensions['disponibilidad_lock'] = threading.Lock()
+        app.extensions['disponibilidad_reconstruyendo'] = threading.Lock()
+
+    @property
+    def estado(self):
+        return current_app.extensions['disponibilidad']
+
+    def construir(self):
+        from app.cache import cache
+        version = cache.version('libros') # Se lee antes de consultar: si alguien escribe en medio, quedará desfasada
+        disponibles, existentes = MapaBits(), MapaBits()
+        for id, disponible in db.session.execute(db.select(Libro.id, Libro.disponible)).yield_per(10_000):
+            existentes.poner(id, True)
+            if disponible:
+                disponibles.poner(id, True)
+        self.estado.update({'disponibles': disponibles, 'existentes': existentes, 'version': version})
+
+    def vigente(self):
+        """True si la copia refleja la versión actual del catálogo (sin consultar la BD).
+
+        Sin versión (backend de cache caído) nunca lo está: no hay forma de saber si otro proceso escribió.
+        """
+        from app.cache import cache
+        version = cache.version('libros')
+        estado = self.estado
+        return version is not None and estado['disponibles'] is not None and estado['version'] == version
+
+    def contar(self):
+        if self.vigente():
+            return len(self.estado['disponibles'])
+        # La petición no espera la reconstrucción (O(N)): COUNT sobre el índice parcial ix_libros_disponibles
+        self._reconciliar_en_segundo_plano()
+        return db.session.scalar(db.select(db.func.count()).select_from(Libro).where(Libro.disponible == True))
+
+    def precheck(self, libro_id):
+        """'no_existe', 'no_disponible' o None si no se puede descartar sin consultar la BD"""
+        if not self.vigente():
+            self._reconciliar_en_segundo_plano()
+            return None
+        if libro_id not in self.estado['existentes']:
+            return 'no_existe'
+        if libro_id not in self.estado['disponibles']:
+            return 'no_disponible'
+        return None
+
+    def _reconciliar_en_segundo_plano(self):
+        # La petición no espera la reconstrucción: la hace otro hilo (uno a la vez)
+        from app.cache import cache
+        if cache.version('libros') is None:
+            return # Una copia construida sin versión tampoco sería confiable
+        app = current_app._get_current_object()
+        lock = app.extensions['disponibilidad_reconstruyendo']
+        if not lock.acquire(blocking=False):
+            return
+
+        def tarea():
+            try:
+                with app.app_context():
+                    self.construir()
+            finally:
+                lock.release()
+        threading.Thread(target=tarea, daemon=True).start()
+
+    def registrar(self, cambios, version):
+        """Aplica {libro_id: disponible (None si se eliminó)} tras una escritura propia.
+
+        version es la versión de 'libros' que dejó esta escritura: si es justo la siguiente
+        a la de la copia, nadie más escribió y la copia sigue vigente.
+        """
+        estado = self.estado
+        if estado['disponibles'] is None:
+            return
+        with current_app.extensions['disponibilidad_lock']:
+            for libro_id, disponible in cambios.items():
+                estado['existentes'].poner(libro_id, disponible is not None)
+                estado['disponibles'].poner(libro_id, bool(disponible))
+            if estado['version'] is not None and version == estado['version'] + 1:
+                estado['version'] = version
+            else:
+                estado['version'] = None # Desfasada: se reconcilia en el próximo uso
+
+    def reiniciar(self):
+        self.estado['disponibles'] = None
+
+
+disponibilidad = Disponibilidad()
@@ -0,0 +1,51 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models import db, Usuario, Libro, EstadisticaLibro, EstadisticaUsuario, EstadisticaDiaria
+
+# Estadísticas de circulación mantenidas de forma incremental: cada préstamo o devolución
+# suma en las tablas resumen con un INSERT ... ON CONFLICT DO UPDATE dentro de la misma
+# transacción, así que nunca quedan desfasadas respecto a prestamos. Los reportes leen las
+# tablas resumen (por índice), no hacen GROUP BY sobre el historial.
+
+
+def incrementar(modelo, clave, **incrementos):
+    """Suma los incrementos a la fila de clave, creándola si no existe (upsert atómico)"""
+    insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    sentencia = insert(modelo).values(**clave, **incrementos)
+    db.session.execute(sentencia.on_conflict_do_update(
+        index_elements=list(clave),
+        set_={campo: getattr(modelo, campo) + sentencia.excluded[campo] for campo in incrementos},
+    ))
+
+
+def registrar_prestamo(usuario_id, libro_id, fecha):
+    incrementar(EstadisticaLibro, {'libro_id': libro_id}, prestamos=1)
+    incrementar(EstadisticaUsuario, {'usuario_id': usuario_id}, prestamos=1)
+    incrementar(EstadisticaDiaria, {'dia': fecha.date()}, prestamos=1)
+
+
+def registrar_devoluciones(cantidad, fecha):
+    incrementar(EstadisticaDiaria, {'dia': fecha.date()}, devoluciones=cantidad)
+
+
+# Consultas de los reportes: select() que las rutas ejecutan con leer_filas
+
+def top_libros(limit):
+    return (select(EstadisticaLibro.libro_id, Libro.titulo, Libro.autor, EstadisticaLibro.prestamos)
+        .join(Libro, Libro.id == EstadisticaLibro.libro_id)
+        .order_by(EstadisticaLibro.prestamos.desc(), EstadisticaLibro.libro_id.desc())
+        .limit(limit))
+
+
+def top_usuarios(limit):
+    return (select(EstadisticaUsuario.usuario_id, Usuario.nombre, EstadisticaUsuario.prestamos)
+        .join(Usuario, Usuario.id == EstadisticaUsuario.usuario_id)
+        .order_by(EstadisticaUsuario.prestamos.desc(), EstadisticaUsuario.usuario_id.desc())
+        .limit(limit))
+
+
+def por_dia(desde, hasta):
+    return (select(EstadisticaDiaria.dia, EstadisticaDiaria.prestamos, EstadisticaDiaria.devoluciones)
+        .where(EstadisticaDiaria.dia.between(desde, hasta))
+        .order_by(EstadisticaDiaria.dia))
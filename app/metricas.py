@@ -0,0 +1,343 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los buckets del histograma de latencia, los mismos que usa prometheus_client por defecto
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+    def __init__(self):
+        self.conteos = [0] * (len(BUCKETS) + 1) # El último es +Inf
+        self.suma = 0.0
+
+    def observar(self, valor):
+        i = 0
+        while i < len(BUCKETS) and valor > BUCKETS[i]:
+            i += 1
+        self.conteos[i] += 1
+        self.suma += valor
+
+    def sumar(self, conteos, suma):
+        self.conteos = [a + b for a, b in zip(self.conteos, conteos)]
+        self.suma += suma
+
+
+class EstadisticasRuta:
+    def __init__(self):
+        self.latencia = Histograma()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.tiempo_serializacion = 0.0
+        self.estados = Counter() # Respuestas por código HTTP (como texto, igual que en el JSON de los volcados)
+
+    def to_dict(self):
+        return {
+            'latencia': list(self.latencia.conteos),
+            'suma': self.latencia.suma,
+            'consultas': self.consultas,
+            'tiempo_db': self.tiempo_db,
+            'tiempo_serializacion': self.tiempo_serializacion,
+            'estados': dict(self.estados),
+        }
+
+    def sumar(self, datos):
+        """Acumula las estadísticas (to_dict) de la misma ruta en otro proceso"""
+        self.latencia.sumar(datos['latencia'], datos['suma'])
+        self.consultas += datos['consultas']
+        self.tiempo_db += datos['tiempo_db']
+        self.tiempo_serializacion += datos['tiempo_serializacion']
+        self.estados.update(datos['estados'])
+
+
+def sumar(fase, segundos):
+    if has_app_context():
+        tiempos = g.get('tiempos')
+        if tiempos is not None:
+            tiempos[fase] += segundos
+
+
+class Metricas:
+    """Tiempos por petición (BD, serialización, JSON, total) para Server-Timing y /metrics.
+
+    Cada petición acumula sus tiempos en g; al terminar se agregan por ruta bajo un lock.
+    El costo es de unos pocos perf_counter() por petición y por consulta, así que queda
+    siempre activo.
+
+    Los contadores viven en la memoria de cada worker. Con METRICAS_DIR (gunicorn.conf.py lo
+    fija) cada worker vuelca los suyos a METRICAS_DIR/<pid>.json como máximo una vez cada
+    METRICAS_INTERVALO segundos, y /metrics suma los de todos los procesos, incluidos los
+    workers ya reciclados; los gauges del pool salen por worker vivo, con la etiqueta pid.
+    Sin METRICAS_DIR, /metrics reporta solo el worker que atiende el scrape.
+    """
+
+    def init_app(self, app):
+        app.extensions['metricas'] = {}
+        app.extensions['metricas_lock'] = threading.Lock()
+        app.extensions['metricas_volcado'] = {'ultimo': 0.0}
+        self.instrumentar_json(app.json)
+
+        with app.app_context():
+            from app.models import db
+            self.instrumentar_engine(db.engine)
+
+        app.before_request(self._iniciar)
+        app.after_request(self._terminar)
+        app.teardown_request(self._registrar)
+
+    def instrumentar_engine(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def antes(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def despues(conn, cursor, statement, parameters, context, executemany):
+            duracion = time.perf_counter() - conn.info['inicio_consulta'].pop()
+            if has_app_context():
+                tiempos = g.get('tiempos')
+                if tiempos is not None:
+                    tiempos['db'] += duracion
+                    tiempos['consultas'] += 1
+
+    def instrumentar_json(self, proveedor):
+        # Envuelve los métodos de codificación del proveedor JSON (app/serializacion.py), sea cual sea.
+        # JSONProviderRapido.response usa dumps_bytes sin pasar por dumps, así que no se cuenta dos veces
+        for nombre in ('dumps', 'dumps_bytes'):
+            original = getattr(proveedor, nombre, None)
+            if original is not None:
+                setattr(proveedor, nombre, self._medido(original))
+
+    def _medido(self, codificar):
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return codificar(*args, **kwargs)
+            finally:
+                sumar('json', time.perf_counter() - inicio)
+        return envoltura
+
+    @contextmanager
+    def medir(self, fase='serializacion'):
+        """Suma a la petición en curso el tiempo del bloque (p. ej. serializar una lista)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            sumar(fase, time.perf_counter() - inicio)
+
+    def _iniciar(self):
+        g.tiempos = {'inicio': time.perf_counter(), 'db': 0.0, 'consultas': 0, 'serializacion': 0.0, 'json': 0.0}
+
+    def _terminar(self, response):
+        tiempos = g.get('tiempos')
+        if tiempos is None:
+            return response
+        tiempos['total'] = time.perf_counter() - tiempos['inicio']
+        tiempos['estado'] = response.status_code
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={tiempos["db"] * 1000:.2f};desc="{tiempos["consultas"]} consultas"',
+            f'serializacion;dur={tiempos["serializacion"] * 1000:.2f}',
+            f'json;dur={tiempos["json"] * 1000:.2f}',
+            f'total;dur={tiempos["total"] * 1000:.2f}',
+        ])
+        return response
+
+    def _registrar(self, error):
+        # teardown_request: corre siempre, también cuando una excepción sin manejar impidió llegar
+        # a _terminar (o a otro after_request); esas peticiones cuentan como 500
+        tiempos = g.pop('tiempos', None)
+        if tiempos is None:
+            return
+        total = tiempos.get('total', time.perf_counter() - tiempos['inicio'])
+        estado = 500 if error is not None else tiempos.get('estado', 500)
+
+        clave = (request.url_rule.rule if request.url_rule else 'sin_ruta', request.method)
+        with current_app.extensions['metricas_lock']:
+            ruta = current_app.extensions['metricas'].get(clave)
+            if ruta is None:
+                ruta = current_app.extensions['metricas'][clave] = EstadisticasRuta()
+            ruta.latencia.observar(total)
+            ruta.consultas += tiempos['consultas']
+            ruta.tiempo_db += tiempos['db']
+            ruta.tiempo_serializacion += tiempos['serializacion'] + tiempos['json']
+            ruta.estados[str(estado)] += 1
+
+        if current_app.config.get('METRICAS_DIR'):
+            volcado = current_app.extensions['metricas_volcado']
+            ahora = time.monotonic()
+            if ahora - volcado['ultimo'] >= current_app.config.get('METRICAS_INTERVALO', 1):
+                volcado['ultimo'] = ahora
+                self.volcar()
+
+    def instantanea(self):
+        """Contadores y gauges de este proceso, serializables a JSON"""
+        with current_app.extensions['metricas_lock']:
+            rutas = [{'ruta': ruta, 'metodo': metodo, **datos.to_dict()}
+                     for (ruta, metodo), datos in current_app.extensions['metricas'].items()]
+        pool = current_app.extensions['pool_metricas'].to_dict()
+        cache_stats = current_app.extensions['cache_stats']
+        contadores = {f'db_pool_{clave}_total': pool[clave] for clave in CONTADORES_POOL}
+        contadores.update({f'cache_{clave}_total': cache_stats[clave] for clave in ('hits', 'misses')})
+        gauges = {f'db_pool_{clave}': pool[clave] for clave in GAUGES_POOL if clave in pool}
+        return {'rutas': rutas, 'contadores': contadores, 'gauges': gauges}
+
+    def volcar(self):
+        """Escribe la instantánea de este worker en METRICAS_DIR/<pid>.json (reemplazo atómico)"""
+        directorio = current_app.config['METRICAS_DIR']
+        destino = os.path.join(directorio, f'{os.getpid()}.json')
+        temporal = f'{destino}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            with open(temporal, 'w') as archivo:
+                json.dump(self.instantanea(), archivo)
+            os.replace(temporal, destino)
+        except OSError:
+            logger.warning('No se pudieron volcar las métricas en %s', directorio, exc_info=True)
+
+    def exportar(self):
+        """Métricas en formato de texto de Prometheus: de todos los procesos con METRICAS_DIR, si no del worker"""
+        directorio = current_app.config.get('METRICAS_DIR')
+        if directorio:
+            self.volcar() # Lo propio, al día
+            procesos = leer_volcados(directorio)
+        else:
+            procesos = [(None, self.instantanea())]
+
+        rutas = {}
+        contadores = Counter()
+        for _, instantanea in procesos:
+            for datos in instantanea['rutas']:
+                rutas.setdefault((datos['ruta'], datos['metodo']), EstadisticasRuta()).sumar(datos)
+            contadores.update(instantanea['contadores'])
+        rutas = sorted(rutas.items())
+
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+
+        metrica('http_request_duration_seconds', 'histogram', 'Latencia de las peticiones por ruta')
+        for (ruta, metodo), datos in rutas:
+            etiquetas = f'route="{ruta}",method="{metodo}"'
+            acumulado = 0
+            for limite, conteo in zip(BUCKETS + ('+Inf',), datos.latencia.conteos):
+                acumulado += conteo
+                lineas.append(f'http_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'http_request_duration_seconds_sum{{{etiquetas}}} {datos.latencia.suma}')
+            lineas.append(f'http_request_duration_seconds_count{{{etiquetas}}} {acumulado}')
+        metrica('http_requests_total', 'counter', 'Respuestas por ruta y código HTTP (incluye excepciones sin manejar como 500)')
+        for (ruta, metodo), datos in rutas:
+            for estado, conteo in sorted(datos.estados.items()):
+                lineas.append(f'http_requests_total{{route="{ruta}",method="{metodo}",status="{estado}"}} {conteo}')
+        metrica('db_queries_total', 'counter', 'Consultas SQL ejecutadas por ruta')
+        for (ruta, metodo), datos in rutas:
+            lineas.append(f'db_queries_total{{route="{ruta}",method="{metodo}"}} {datos.consultas}')
+        metrica('db_query_seconds_total', 'counter', 'Tiempo en la base de datos por ruta')
+        for (ruta, metodo), datos in rutas:
+            lineas.append(f'db_query_seconds_total{{route="{ruta}",method="{metodo}"}} {datos.tiempo_db}')
+        metrica('serialization_seconds_total', 'counter', 'Tiempo serializando filas y codificando JSON por ruta')
+        for (ruta, metodo), datos in rutas:
+            lineas.append(f'serialization_seconds_total{{route="{ruta}",method="{metodo}"}} {datos.tiempo_serializacion}')
+
+        for clave in CONTADORES_POOL:
+            metrica(f'db_pool_{clave}_total', 'counter', f'Pool de conexiones: {clave}')
+            lineas.append(f'db_pool_{clave}_total {contadores[f"db_pool_{clave}_total"]}')
+        for clave in GAUGES_POOL:
+            nombre = f'db_pool_{clave}'
+            valores = [(pid, instantanea['gauges'][nombre]) for pid, instantanea in procesos if nombre in instantanea['gauges']]
+            if valores:
+                metrica(nombre, 'gauge', f'Pool de conexiones: {clave}')
+                for pid, valor in valores:
+                    lineas.append(f'{nombre}{{pid="{pid}"}} {valor}' if pid is not None else f'{nombre} {valor}')
+
+        for clave in ('hits', 'misses'):
+            metrica(f'cache_{clave}_total', 'counter', f'Cache de respuestas: {clave}')
+            lineas.append(f'cache_{clave}_total {contadores[f"cache_{clave}_total"]}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+CONTADORES_POOL = ('checkouts', 'conexiones_nuevas', 'timeouts')
+GAUGES_POOL = ('en_uso', 'en_uso_max', 'espera_max_ms', 'tamano', 'overflow')
+TERMINADOS = 'terminados.json' # Contadores acumulados de los workers que ya terminaron
+
+
+@contextmanager
+def bloqueo(directorio, modo):
+    # Lectores (/metrics) con LOCK_SH; retirar_proceso con LOCK_EX, para no contar un worker dos veces (o ninguna)
+    with open(os.path.join(directorio, '.lock'), 'a') as archivo:
+        fcntl.flock(archivo, modo)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def leer_json(ruta):
+    try:
+        with open(ruta) as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None # Borrado por retirar_proceso entre el glob y el open
+
+
+def leer_volcados(directorio):
+    """[(pid, instantánea)] de los workers vivos, más (None, acumulado) de los que terminaron (sin gauges)"""
+    procesos = []
+    with bloqueo(directorio, fcntl.LOCK_SH):
+        for ruta in glob.glob(os.path.join(directorio, '*.json')):
+            instantanea = leer_json(ruta)
+            if instantanea is None:
+                continue
+            nombre = os.path.basename(ruta)
+            procesos.append((None, instantanea) if nombre == TERMINADOS else (int(nombre[:-len('.json')]), instantanea))
+    return procesos
+
+
+def retirar_proceso(directorio, pid):
+    """Pasa los contadores de un worker que terminó a TERMINADOS (child_exit de gunicorn, en el maestro).
+
+    Los totales no retroceden cuando max_requests recicla un worker, y el directorio no crece
+    con un archivo por cada worker que existió.
+    """
+    ruta = os.path.join(directorio, f'{pid}.json')
+    if not os.path.exists(ruta):
+        return # El worker no llegó a volcar nada
+    with bloqueo(directorio, fcntl.LOCK_EX):
+        instantanea = leer_json(ruta)
+        if instantanea is None:
+            return
+        acumulado = leer_json(os.path.join(directorio, TERMINADOS)) or {'rutas': [], 'contadores': {}, 'gauges': {}}
+        rutas = {(datos['ruta'], datos['metodo']): datos for datos in acumulado['rutas']}
+        for datos in instantanea['rutas']:
+            clave = (datos['ruta'], datos['metodo'])
+            if clave in rutas:
+                total = EstadisticasRuta()
+                total.sumar(rutas[clave])
+                total.sumar(datos)
+                rutas[clave] = {'ruta': clave[0], 'metodo': clave[1], **total.to_dict()}
+            else:
+                rutas[clave] = datos
+        contadores = Counter(acumulado['contadores'])
+        contadores.update(instantanea['contadores'])
+
+        temporal = os.path.join(directorio, f'{TERMINADOS}.tmp')
+        with open(temporal, 'w') as archivo:
+            json.dump({'rutas': list(rutas.values()), 'contadores': contadores, 'gauges': {}}, archivo)
+        os.replace(temporal, os.path.join(directorio, TERMINADOS))
+        os.remove(ruta)
+
+
+metricas = Metricas()
@@ -16,17 +16,27 @@ class Usuario(db.Model): #db.Model es la que proporciona SQLAlchemy para definir
     nombre = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Contadores que mantienen el préstamo y la devolución (evitan un COUNT(*) sobre prestamos);
+    # `flask reconciliar-contadores` los corrige si se desfasan
+    prestamos_activos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_prestamos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     def to_dict(self): # Método para convertir el objeto a un diccionario, útil para respuestas JSON
     #Ya que no se puede serializar directamente un objeto de SQLAlchemy a JSON
         return {
             'id': self.id,
             'nombre': self.nombre,
-            'email': self.email
+            'email': self.email,
+            'prestamos_activos': self.prestamos_activos,
+            'total_prestamos': self.total_prestamos
         }
 
 class Libro(db.Model):
     __tablename__ = 'libros'
+    __table_args__ = (
+        # Índice parcial: solo contiene los libros disponibles, ordenados por id (sirve a /libros/disponibles paginado)
+        db.Index('ix_libros_disponibles', 'id', postgresql_where=db.text('disponible = true'), sqlite_where=db.text('disponible = 1')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
@@ -34,6 +44,8 @@ class Libro(db.Model):
     isbn = db.Column(db.String(13), unique=True, nullable=False)
     disponible = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    prestamos_activos = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Igual que en Usuario
+    total_prestamos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     def to_dict(self):
         return {
@@ -41,16 +53,29 @@ class Libro(db.Model):
             'titulo': self.titulo,
             'autor': self.autor,
             'isbn': self.isbn,
-            'disponible': self.disponible
+            'disponible': self.disponible,
+            'prestamos_activos': self.prestamos_activos,
+            'total_prestamos': self.total_prestamos
         }
 
 class Prestamo(db.Model):
     __tablename__ = 'prestamos'
+    __table_args__ = (
+        # Índice parcial de préstamos activos por libro (checkout, devolución, disponibilidad)
+        db.Index('ix_prestamos_activos', 'libro_id', postgresql_where=db.text('activo = true'), sqlite_where=db.text('activo = 1')),
+        # Préstamos activos por fecha de vencimiento (GET /prestamos/vencidos recorre solo el rango vencido)
+        db.Index('ix_prestamos_vencimiento', 'fecha_vencimiento', 'id', postgresql_where=db.text('activo = true'), sqlite_where=db.text('activo = 1')),
+        # Los ids no se reutilizan en SQLite aunque se archive el último préstamo: siguen siendo únicos
+        # entre prestamos y prestamos_archivados (PostgreSQL ya usa una secuencia)
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
-    libro_id = db.Column(db.Integer, db.ForeignKey('libros.id'), nullable=False)
+    # index=True en las llaves foráneas: PostgreSQL no las indexa automáticamente
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    libro_id = db.Column(db.Integer, db.ForeignKey('libros.id'), nullable=False, index=True)
     fecha_prestamo = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_vencimiento = db.Column(db.DateTime) # Se fija al prestar: fecha_prestamo + DIAS_PRESTAMO
     fecha_devolucion = db.Column(db.DateTime)
     activo = db.Column(db.Boolean, default=True)
     
@@ -66,6 +91,49 @@ class Prestamo(db.Model):
             'usuario_nombre': self.usuario.nombre,
             'libro_titulo': self.libro.titulo,
             'fecha_prestamo': self.fecha_prestamo.isoformat(),
+            'fecha_vencimiento': self.fecha_vencimiento.isoformat() if self.fecha_vencimiento else None,
             'fecha_devolucion': self.fecha_devolucion.isoformat() if self.fecha_devolucion else None,
             'activo': self.activo
-        }
\ No newline at end of file
+        }
+
+class PrestamoArchivado(db.Model):
+    # Préstamos devueltos hace más de ARCHIVO_DIAS, movidos fuera de prestamos por `flask archivar-prestamos`
+    # (ver app/archivo.py): la tabla prestamos y sus índices quedan con los activos y los recientes.
+    # Conservan su id original; GET /prestamos?incluir_historial=1 los lee junto con los de prestamos
+    __tablename__ = 'prestamos_archivados'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    libro_id = db.Column(db.Integer, db.ForeignKey('libros.id'), nullable=False, index=True)
+    fecha_prestamo = db.Column(db.DateTime)
+    fecha_vencimiento = db.Column(db.DateTime)
+    fecha_devolucion = db.Column(db.DateTime, nullable=False)
+
+# ============= ESTADÍSTICAS DE CIRCULACIÓN =============
+# Tablas resumen que crear_prestamo y las devoluciones actualizan en la misma transacción
+# (ver app/estadisticas.py): los reportes leen pocas filas sin importar el tamaño del historial
+
+class EstadisticaLibro(db.Model):
+    __tablename__ = 'estadisticas_libros'
+    __table_args__ = (
+        db.Index('ix_estadisticas_libros_ranking', 'prestamos', 'libro_id'), # Top N sin ordenar la tabla
+    )
+
+    libro_id = db.Column(db.Integer, db.ForeignKey('libros.id', ondelete='CASCADE'), primary_key=True)
+    prestamos = db.Column(db.Integer, nullable=False, default=0)
+
+class EstadisticaUsuario(db.Model):
+    __tablename__ = 'estadisticas_usuarios'
+    __table_args__ = (
+        db.Index('ix_estadisticas_usuarios_ranking', 'prestamos', 'usuario_id'),
+    )
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True)
+    prestamos = db.Column(db.Integer, nullable=False, default=0)
+
+class EstadisticaDiaria(db.Model):
+    __tablename__ = 'estadisticas_diarias'
+
+    dia = db.Column(db.Date, primary_key=True) # Día UTC
+    prestamos = db.Column(db.Integer, nullable=False, default=0)
+    devoluciones = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+
+class MetricasPool:
+    """Métricas del pool de conexiones de un proceso, para dimensionar el pool por worker"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    @property
+    def pool(self):
+        # Siempre el pool actual del engine: dispose() (post_fork de gunicorn) lo reemplaza por uno nuevo
+        return self.engine.pool
+
+    def reiniciar(self):
+        with self._lock:
+            self.checkouts = 0 # Conexiones entregadas por el pool
+            self.conexiones_nuevas = 0 # Conexiones físicas abiertas contra la BD
+            self.timeouts = 0 # Esperas que superaron pool_timeout
+            self.esperas = 0
+            self.espera_total = 0.0 # Segundos esperando una conexión (incluye abrirla si hacía falta)
+            self.espera_max = 0.0
+            self.en_uso_max = 0
+
+    def sumar(self, contador):
+        # Con gthread varios hilos toman conexiones a la vez: += fuera del lock puede perder incrementos
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+
+    def registrar_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.en_uso_max = max(self.en_uso_max, self.pool.checkedout())
+
+    def to_dict(self):
+        datos = {
+            'checkouts': self.checkouts,
+            'conexiones_nuevas': self.conexiones_nuevas,
+            'timeouts': self.timeouts,
+            'espera_promedio_ms': self.espera_total / self.esperas * 1000 if self.esperas else 0.0,
+            'espera_max_ms': self.espera_max * 1000,
+            'en_uso': self.pool.checkedout(),
+            'en_uso_max': self.en_uso_max,
+        }
+        # Solo QueuePool (PostgreSQL) tiene tamaño y overflow
+        if hasattr(self.pool, 'overflow'):
+            datos.update({'tamano': self.pool.size(), 'overflow': self.pool.overflow()})
+        return datos
+
+
+def instrumentar_pool(engine):
+    metricas = MetricasPool(engine)
+    raw_connection_original = engine.raw_connection
+
+    def raw_connection():
+        # Mide cuánto espera la petición por una conexión libre. Se envuelve el engine y no el pool:
+        # el engine sobrevive a dispose(), el pool no
+        inicio = time.perf_counter()
+        try:
+            return raw_connection_original()
+        except PoolTimeoutError:
+            metricas.sumar('timeouts')
+            raise
+        finally:
+            metricas.registrar_espera(time.perf_counter() - inicio)
+
+    engine.raw_connection = raw_connection
+
+    # Los eventos del pool se registran a través del engine; recreate() los copia al pool nuevo
+    @event.listens_for(engine, 'connect')
+    def al_conectar(dbapi_connection, connection_record):
+        metricas.sumar('conexiones_nuevas')
+
+    @event.listens_for(engine, 'checkout')
+    def al_entregar(dbapi_connection, connection_record, connection_proxy):
+        metricas.registrar_checkout()
+
+    @event.listens_for(engine, 'engine_disposed')
+    def al_descartar(engine):
+        # Pool nuevo (en gunicorn, uno por worker): lo contado en el maestro antes del fork no es de este pool
+        metricas.reiniciar()
+
+    return metricas
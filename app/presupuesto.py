@@ -0,0 +1,86 @@
+import logging
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+class PresupuestoExcedido(Exception):
+    """Una petición ejecutó más consultas de las permitidas o repitió una consulta (N+1)"""
+
+
+def presupuesto(consultas):
+    """Máximo de sentencias SQL por petición para la vista decorada.
+
+    Va justo debajo de @main_bp.route; PRESUPUESTO_CONSULTAS en la configuración
+    ({endpoint: máximo}) lo reemplaza sin tocar el código.
+    """
+    def decorador(vista):
+        vista.presupuesto_consultas = consultas
+        return vista
+    return decorador
+
+
+class PresupuestoConsultas:
+    """Cuenta las sentencias SQL de cada petición y las compara con el presupuesto de su ruta.
+
+    Además detecta N+1: la misma sentencia (mismo SQL, distintos parámetros) ejecutada
+    más de PRESUPUESTO_REPETICIONES veces. Con PRESUPUESTO_ESTRICTO (pruebas) lanza
+    PresupuestoExcedido; en producción solo deja un warning en el log.
+    """
+
+    def init_app(self, app):
+        with app.app_context():
+            from app.models import db
+            self.instrumentar_engine(db.engine)
+
+        app.before_request(self._iniciar)
+        app.after_request(self._verificar)
+
+    def instrumentar_engine(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def contar(conn, cursor, statement, parameters, context, executemany):
+            if has_app_context():
+                sentencias = g.get('sentencias')
+                if sentencias is None:
+                    return
+                if executemany:
+                    # Los lotes de un INSERT masivo (insertmanyvalues) cuentan como una sola sentencia
+                    g.sentencias_lote.add(statement)
+                else:
+                    sentencias[statement] += 1
+
+    def _iniciar(self):
+        g.sentencias = Counter()
+        g.sentencias_lote = set()
+
+    def _verificar(self, response):
+        sentencias = g.pop('sentencias', None)
+        if sentencias is None:
+            return response
+
+        maximo = current_app.config.get('PRESUPUESTO_CONSULTAS', {}).get(request.endpoint)
+        if maximo is None:
+            vista = current_app.view_functions.get(request.endpoint)
+            maximo = getattr(vista, 'presupuesto_consultas', None)
+
+        problemas = []
+        total = sum(sentencias.values()) + len(g.pop('sentencias_lote'))
+        if maximo is not None and total > maximo:
+            problemas.append(f'{total} consultas (presupuesto: {maximo})')
+        repeticiones = current_app.config.get('PRESUPUESTO_REPETICIONES', 2)
+        for sentencia, veces in sentencias.items():
+            if veces > repeticiones:
+                problemas.append(f'posible N+1, {veces} veces: {sentencia}')
+
+        if problemas:
+            mensaje = f'{request.method} {request.path}: ' + '; '.join(problemas)
+            if current_app.config.get('PRESUPUESTO_ESTRICTO'):
+                raise PresupuestoExcedido(mensaje)
+            logger.warning(mensaje)
+        return response
+
+
+presupuesto_consultas = PresupuestoConsultas()
@@ -1,19 +1,279 @@
-from flask import Blueprint, request, jsonify # Jsonify convierte respuestas a JSON
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context # Jsonify convierte respuestas a JSON
 # Tambien importo request para manejar peticiones HTTP
+from collections import Counter
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from app.models import db, Usuario, Libro, Prestamo
-from datetime import datetime, timedelta
+from app.cache import cache
+from app.busqueda import consulta_busqueda
+from app.autocompletar import autocompletar
+from app.disponibilidad import disponibilidad
+from app.metricas import metricas
+from app.presupuesto import presupuesto
+from app.serializacion import COLUMNAS, SERIALIZADORES, proyectar, serializador_filas
+from app import estadisticas
+from app.vencidos import CAMPOS as CAMPOS_VENCIDOS, consulta_vencidos
+from app.archivo import consulta_con_historial
+from app.commit_agrupado import commit_agrupado
+from datetime import date, datetime, timedelta
 
 main_bp = Blueprint('main', __name__) #Crea un blueprint llamado 'main' para agrupar las rutas de la aplicación
 
 # @main_bp viene del import de routes.py, que es donde se define el blueprint
 
+# ============= LECTURAS =============
+
+def leer_todos(query):
+    if hasattr(query, 'all'):
+        return query.all()
+    return db.session.scalars(query).all() # select() de SQLAlchemy Core/2.0
+
+def leer_filas(query):
+    # Como leer_todos, pero para consultas de columnas (proyecciones): devuelve filas, no objetos
+    return db.session.execute(getattr(query, 'statement', query)).all()
+
+def lectura_core():
+    # LECTURA_CORE (config.py): True en todas las lecturas o el conjunto de endpoints que la usan
+    rutas = current_app.config.get('LECTURA_CORE', False)
+    return rutas is True or bool(rutas) and request.endpoint in rutas
+
+def detalle(query, modelo, error):
+    if lectura_core():
+        campos = tuple(COLUMNAS[modelo])
+        filas = leer_filas(proyectar(query, modelo, campos).limit(1))
+        if not filas:
+            return jsonify({'error': error}), 404
+        with metricas.medir():
+            datos = serializador_filas(campos).fila(filas[0])
+        return jsonify(datos)
+
+    obj = query.first()
+    if not obj:
+        return jsonify({'error': error}), 404
+    with metricas.medir():
+        datos = SERIALIZADORES[modelo].objeto(obj)
+    return jsonify(datos)
+
+
+# ============= PAGINACIÓN POR CURSOR =============
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+def campos_pedidos(modelo):
+    # Campos de ?fields=id,titulo (None si no se envió); ValueError con el mensaje si alguno no existe
+    campos = tuple(dict.fromkeys(c.strip() for c in request.args['fields'].split(',') if c.strip()))
+    desconocidos = [c for c in campos if c not in COLUMNAS[modelo]]
+    if desconocidos or not campos:
+        raise ValueError(f'Campos inválidos en fields: {", ".join(desconocidos) or "(vacío)"}. '
+                         f'Disponibles: {", ".join(COLUMNAS[modelo])}')
+    return campos
+
+def pagina_pedida():
+    # (limit, after) de ?limit= y ?after=; ValueError con el mensaje si no son válidos
+    try:
+        limit = int(request.args.get('limit', LIMITE_POR_DEFECTO))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        raise ValueError('limit y after deben ser enteros')
+    if limit < 1:
+        raise ValueError('limit debe ser mayor que 0')
+    return min(limit, LIMITE_MAXIMO), after
+
+def listar(query, modelo):
+    # ?fields=id,titulo trae solo esas columnas en filas de Core, sin crear objetos del ORM
+    # (con LECTURA_CORE, todas las columnas por el mismo camino)
+    campos = None
+    if 'fields' in request.args:
+        try:
+            campos = campos_pedidos(modelo)
+        except ValueError as error:
+            return jsonify({'error': str(error)}), 400
+    elif lectura_core():
+        campos = tuple(COLUMNAS[modelo]) # Todos los campos, pero en filas de Core
+
+    # Sin ?limit= ni ?after= se devuelve la lista completa (comportamiento original)
+    if 'limit' not in request.args and 'after' not in request.args:
+        if campos:
+            query, serializador = proyectar(query, modelo, campos), serializador_filas(campos)
+            leer, serializar = leer_filas, serializador.filas
+        else:
+            serializador = SERIALIZADORES[modelo]
+            leer, serializar = leer_todos, serializador.objetos
+        if pide_streaming():
+            return transmitir(query, serializador.fila if campos else serializador.objeto)
+        resultado = leer(query)
+        with metricas.medir():
+            datos = serializar(resultado)
+        return jsonify(datos)
+
+    try:
+        limit, after = pagina_pedida()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    if campos:
+        # Se proyecta (con sus JOIN) antes del LIMIT: SQLAlchemy no permite agregar un JOIN después.
+        # El id va como última columna de cada fila, solo para el cursor
+        query = proyectar(query, modelo, campos, cursor=True)
+
+    # Keyset sobre la llave primaria: WHERE id > :after ORDER BY id LIMIT n+1
+    # El costo de cada página es constante, sin importar qué tan profundo vaya el cliente (no usa OFFSET)
+    pagina = query.filter(modelo.id > after).order_by(modelo.id).limit(limit + 1)
+    if campos:
+        filas = leer_filas(pagina)
+        serializar, ultimo_id = serializador_filas(campos, ignorar=1).filas, lambda fila: fila[-1]
+    else:
+        filas = leer_todos(pagina)
+        serializar, ultimo_id = SERIALIZADORES[modelo].objetos, lambda obj: obj.id
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+
+    with metricas.medir():
+        items = serializar(filas)
+    return jsonify({
+        'items': items,
+        'next_cursor': ultimo_id(filas[-1]) if hay_mas else None # Se envía como ?after= para pedir la siguiente página
+    })
+
+
+# ============= RESPUESTAS EN STREAMING =============
+
+TAMANO_LOTE_STREAM = 1000
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+def pide_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', MIMETYPE_NDJSON]) == MIMETYPE_NDJSON
+
+def pide_streaming():
+    # ?stream=1 transmite un arreglo JSON; Accept: application/x-ndjson transmite una fila por línea
+    return request.args.get('stream', '').lower() in ('1', 'true') or pide_ndjson()
+
+def transmitir(query, serializar):
+    # serializar: función objeto (o fila) -> dict
+    ndjson = pide_ndjson()
+    dumps = current_app.json.dumps
+    # yield_per usa un cursor del lado del servidor (stream_results) y trae las filas por lotes,
+    # así la memoria se mantiene plana sin importar el tamaño de la tabla
+    filas = query.yield_per(TAMANO_LOTE_STREAM)
+
+    def generar():
+        if not ndjson:
+            yield '['
+        lote = []
+        primero = True
+        for obj in filas:
+            if ndjson:
+                lote.append(dumps(serializar(obj)) + '\n')
+            else:
+                lote.append(('' if primero else ',') + dumps(serializar(obj)))
+                primero = False
+            if len(lote) >= TAMANO_LOTE_STREAM:
+                yield ''.join(lote)
+                lote = []
+        if lote:
+            yield ''.join(lote)
+        if not ndjson:
+            yield ']'
+
+    # stream_with_context mantiene vivo el contexto (y la sesión) mientras se envía el cuerpo
+    return Response(stream_with_context(generar()), mimetype=MIMETYPE_NDJSON if ndjson else 'application/json')
+
+
+# ============= CREACIÓN EN LOTE =============
+
+LIMITE_LOTE = 5000
+
+def excede_columna(modelo, campo, valor):
+    # True si el texto no cabe en la columna (String(n)); las columnas sin largo aceptan cualquiera
+    largo = getattr(modelo, campo).type.length
+    return largo is not None and len(valor) > largo
+
+def crear_en_lote(modelo, campos, campo_unico, error_duplicado, al_crear=None):
+    data = request.get_json()
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Se espera un arreglo JSON no vacío'}), 400
+    if len(data) > LIMITE_LOTE:
+        return jsonify({'error': f'Máximo {LIMITE_LOTE} elementos por lote'}), 400
+
+    resultados = [None] * len(data)
+
+    # Validar cada elemento igual que en la creación individual
+    validos = []
+    for i, item in enumerate(data):
+        faltante = next((c for c in campos if not isinstance(item, dict) or not item.get(c)), None)
+        if faltante:
+            resultados[i] = {'indice': i, 'error': f'{faltante} es requerido'}
+            continue
+        # Solo texto: una lista o un objeto no se puede comparar ni usar en el IN (y haría fallar todo el lote)
+        invalido = next((c for c in campos if not isinstance(item[c], str)), None)
+        if invalido:
+            resultados[i] = {'indice': i, 'error': f'{invalido} debe ser texto'}
+            continue
+        # Largo máximo de la columna: en PostgreSQL un valor demasiado largo haría fallar el INSERT de todo el lote
+        largo = next((c for c in campos if excede_columna(modelo, c, item[c])), None)
+        if largo:
+            resultados[i] = {'indice': i, 'error': f'{largo} admite como máximo {getattr(modelo, largo).type.length} caracteres'}
+        else:
+            validos.append((i, {c: item[c] for c in campos}))
+
+    # Un solo SELECT ... WHERE campo IN (...) para detectar duplicados contra la BD
+    columna = getattr(modelo, campo_unico)
+    valores = {fila[campo_unico] for _, fila in validos}
+    existentes = set(db.session.scalars(select(columna).where(columna.in_(valores)))) if valores else set()
+
+    # Duplicados contra la BD o repetidos dentro del mismo lote
+    a_insertar = []
+    vistos = set()
+    for i, fila in validos:
+        if fila[campo_unico] in existentes or fila[campo_unico] in vistos:
+            resultados[i] = {'indice': i, 'error': error_duplicado}
+        else:
+            vistos.add(fila[campo_unico])
+            a_insertar.append((i, fila))
+
+    if a_insertar:
+        # INSERT de varias filas (executemany / insertmanyvalues) en una sola transacción;
+        # RETURNING ordenado según los parámetros para asociar cada id con su elemento
+        try:
+            ids = db.session.scalars(
+                insert(modelo).returning(modelo.id, sort_by_parameter_order=True),
+                [fila for _, fila in a_insertar]
+            ).all()
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición insertó el mismo valor único entre el SELECT y el INSERT: no se crea nada
+            db.session.rollback()
+            return jsonify({'error': f'{error_duplicado} (creado por otra petición al mismo tiempo); reintente el lote'}), 409
+        for (i, _), id in zip(a_insertar, ids):
+            resultados[i] = {'indice': i, 'id': id}
+        if al_crear:
+            al_crear([(id, fila) for (_, fila), id in zip(a_insertar, ids)])
+
+    return jsonify({'creados': len(a_insertar), 'resultados': resultados}), 201 if a_insertar else 400
+
+
 # ============= ENDPOINT DE SALUD =============
 
 
 @main_bp.route('/health', methods=['GET'])
+@presupuesto(0)
 def health_check():
     return jsonify({'status': 'OK', 'message': 'API funcionando correctamente'})
 
+@main_bp.route('/health/pool', methods=['GET'])
+@presupuesto(0)
+def estado_pool():
+    # Métricas del pool de conexiones de este worker
+    return jsonify(current_app.extensions['pool_metricas'].to_dict())
+
+@main_bp.route('/metrics', methods=['GET'])
+@presupuesto(0)
+def exportar_metricas():
+    # Latencias por ruta, consultas, pool y cache de este worker, en formato de Prometheus
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
 
 
 
@@ -21,44 +281,125 @@ def health_check():
 
 
 @main_bp.route('/usuarios', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('usuarios')
 def obtener_usuarios():
-    usuarios = Usuario.query.all() #Lista de usuarios
-    return jsonify([usuario.to_dict() for usuario in usuarios])#Lista comprehension para convertir cada usuario a un diccionario
+    return listar(Usuario.query, Usuario) # Lista de usuarios, paginada si se envía ?limit= o ?after=
+
+@main_bp.route('/usuarios/<int:id>', methods=['GET'])
+@presupuesto(1)
+def obtener_usuario(id):
+    return detalle(Usuario.query.filter_by(id=id), Usuario, 'Usuario no encontrado')
 
 @main_bp.route('/usuarios', methods=['POST'])
+@presupuesto(3)
 def crear_usuario():
     data = request.get_json()
     
     if not data.get('nombre') or not data.get('email'): #If not es para hacer algo si el campo no existe o es None
         return jsonify({'error': 'Nombre y email son requeridos'}), 400
     
-    # Verificar si email ya existe
-    if Usuario.query.filter_by(email=data['email']).first():
-        return jsonify({'error': 'Email ya existe'}), 400
+    # Con COMMIT_AGRUPADO el commit se comparte con otras peticiones del worker (app/commit_agrupado.py)
+    respuesta, status = commit_agrupado.ejecutar(lambda: registrar_usuario(data['nombre'], data['email']))
+    if status == 201:
+        cache.invalidar('usuarios') # Nueva versión del recurso: cambia el ETag de GET /usuarios
+    return jsonify(respuesta), status
+
+def registrar_usuario(nombre, email):
+    # Sentencias del alta, sin commit: commit_agrupado.ejecutar confirma si status < 400
+    # Verificar si email ya existe (también ve los usuarios de las otras peticiones del mismo lote)
+    if Usuario.query.filter_by(email=email).first():
+        return {'error': 'Email ya existe'}, 400
     
-    usuario = Usuario(nombre=data['nombre'], email=data['email']) # Puede recibir cualquier campo que hayas definido en el modelo, excepto los que tienen valores automáticos.
+    usuario = Usuario(nombre=nombre, email=email) # Puede recibir cualquier campo que hayas definido en el modelo, excepto los que tienen valores automáticos.
     db.session.add(usuario) #Carrito de compras que guarda los cambios en la base de datos
-    db.session.commit() # Guarda los cambios en la base de datos
-    return jsonify(usuario.to_dict()), 201
+    db.session.flush() # Asigna el id; el commit lo hace quien llama
+    return usuario.to_dict(), 201
 
 @main_bp.route('/usuarios/<int:id>', methods=['DELETE'])
+@presupuesto(3)
 def eliminar_usuario(id):
     usuario = Usuario.query.get_or_404(id)
     db.session.delete(usuario)
     db.session.commit()
+    cache.invalidar('usuarios')
     return jsonify({'message': 'Usuario eliminado'})
 
+@main_bp.route('/usuarios/bulk', methods=['POST'])
+@presupuesto(2)
+def crear_usuarios_bulk():
+    respuesta = crear_en_lote(Usuario, ['nombre', 'email'], 'email', 'Email ya existe')
+    cache.invalidar('usuarios')
+    return respuesta
+
 
 
 # ============= CRUD LIBROS =============
 
 
 @main_bp.route('/libros', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('libros')
+@cache.cacheado('libros')
 def obtener_libros():
-    libros = Libro.query.all()
-    return jsonify([libro.to_dict() for libro in libros])
+    return listar(Libro.query, Libro)
+
+@main_bp.route('/libros/buscar', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('libros')
+@cache.cacheado('libros')
+def buscar_libros():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'q es requerido'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser entero'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit debe ser mayor que 0'}), 400
+    
+    # ?fields= como en /libros: solo esas columnas, en filas de Core
+    campos = None
+    if 'fields' in request.args:
+        try:
+            campos = campos_pedidos(Libro)
+        except ValueError as error:
+            return jsonify({'error': str(error)}), 400
+    elif lectura_core():
+        campos = tuple(COLUMNAS[Libro])
+
+    # Ordenados por relevancia: índice GIN sobre tsvector en PostgreSQL, FTS5 en SQLite
+    consulta = consulta_busqueda(q, limit)
+    if campos:
+        return jsonify(serializador_filas(campos).filas(leer_filas(proyectar(consulta, Libro, campos))))
+    return jsonify(SERIALIZADORES[Libro].objetos(leer_todos(consulta)))
+
+@main_bp.route('/libros/autocompletar', methods=['GET'])
+@presupuesto(1)
+def autocompletar_libros():
+    prefijo = request.args.get('prefix', '').strip()
+    if not prefijo:
+        return jsonify({'error': 'prefix es requerido'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser entero'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit debe ser mayor que 0'}), 400
+    
+    # Se responde desde el índice en memoria, sin consultar la base de datos en cada tecla
+    return jsonify(autocompletar.buscar(prefijo, limit))
+
+@main_bp.route('/libros/<int:id>', methods=['GET'])
+@presupuesto(1)
+def obtener_libro(id):
+    return detalle(Libro.query.filter_by(id=id), Libro, 'Libro no encontrado')
 
 @main_bp.route('/libros', methods=['POST'])
+@presupuesto(3)
 def crear_libro():
     data = request.get_json()
     
@@ -79,13 +420,33 @@ def crear_libro():
     )
     db.session.add(libro)
     db.session.commit()
+    versiones = cache.invalidar('libros') # El catálogo cambió: las respuestas guardadas dejan de ser válidas
+    autocompletar.agregar(libro.id, libro.titulo, libro.autor)
+    disponibilidad.registrar({libro.id: libro.disponible}, versiones['libros'])
     
     return jsonify(libro.to_dict()), 201
 
+@main_bp.route('/libros/bulk', methods=['POST'])
+@presupuesto(2)
+def crear_libros_bulk():
+    creados = []
+    
+    def al_crear(filas):
+        creados.extend(filas)
+        for id, fila in filas:
+            autocompletar.agregar(id, fila['titulo'], fila['autor'])
+    
+    respuesta = crear_en_lote(Libro, ['titulo', 'autor', 'isbn'], 'isbn', 'ISBN ya existe', al_crear)
+    versiones = cache.invalidar('libros')
+    disponibilidad.registrar({id: True for id, _ in creados}, versiones['libros'])
+    return respuesta
+
 @main_bp.route('/libros/<int:id>', methods=['PUT'])
+@presupuesto(3)
 def actualizar_libro(id):
     libro = Libro.query.get_or_404(id)
     data = request.get_json()
+    anterior = (libro.titulo, libro.autor) # Para actualizar el índice de autocompletado
     
     if 'titulo' in data:
         libro.titulo = data['titulo']
@@ -95,25 +456,112 @@ def actualizar_libro(id):
         libro.disponible = data['disponible']
     
     db.session.commit()
+    versiones = cache.invalidar('libros', 'prestamos') # Los préstamos muestran el título del libro
+    disponibilidad.registrar({libro.id: libro.disponible}, versiones['libros'])
+    if anterior != (libro.titulo, libro.autor):
+        autocompletar.quitar(libro.id, *anterior)
+        autocompletar.agregar(libro.id, libro.titulo, libro.autor)
     return jsonify(libro.to_dict())
 
 @main_bp.route('/libros/<int:id>', methods=['DELETE'])
+@presupuesto(3)
 def eliminar_libro(id):
     libro = Libro.query.get_or_404(id)
+    datos = (libro.id, libro.titulo, libro.autor)
     db.session.delete(libro)
     db.session.commit()
+    versiones = cache.invalidar('libros')
+    autocompletar.quitar(*datos)
+    disponibilidad.registrar({id: None}, versiones['libros'])
     return jsonify({'message': 'Libro eliminado'})
 
 
 
 # ============= GESTIÓN DE PRÉSTAMOS =============
 
+def consulta_prestamos():
+    # Prestamo.to_dict lee usuario.nombre y libro.titulo: se cargan con JOIN en la misma consulta
+    # para evitar 2 SELECT extra por préstamo (patrón N+1)
+    return Prestamo.query.options(joinedload(Prestamo.usuario), joinedload(Prestamo.libro))
+
+def incluir_historial():
+    # ?incluir_historial=1 agrega los préstamos archivados (app/archivo.py); por defecto solo se lee prestamos
+    return request.args.get('incluir_historial', '').lower() in ('1', 'true')
+
+def listar_con_historial():
+    # Préstamos de prestamos y prestamos_archivados, siempre en filas de Core (mismas claves que sin historial)
+    try:
+        campos = campos_pedidos(Prestamo) if 'fields' in request.args else tuple(COLUMNAS[Prestamo])
+        limit, after = pagina_pedida() if 'limit' in request.args or 'after' in request.args else (None, None)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    serializar = serializador_filas(campos, ignorar=1).filas
+    if limit is None:
+        filas = leer_filas(consulta_con_historial(campos))
+        with metricas.medir():
+            datos = serializar(filas)
+        return jsonify(datos)
+
+    filas = leer_filas(consulta_con_historial(campos, after=after, limit=limit + 1))
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+    with metricas.medir():
+        items = serializar(filas)
+    return jsonify({'items': items, 'next_cursor': filas[-1][-1] if hay_mas else None})
+
 @main_bp.route('/prestamos', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('prestamos')
 def obtener_prestamos():
-    prestamos = Prestamo.query.all()
-    return jsonify([prestamo.to_dict() for prestamo in prestamos])
+    if incluir_historial():
+        return listar_con_historial()
+    return listar(consulta_prestamos(), Prestamo)
+
+@main_bp.route('/prestamos/vencidos', methods=['GET'])
+@presupuesto(1)
+def prestamos_vencidos():
+    # Sin cache: lo que está vencido cambia con el reloj, no solo con las escrituras
+    try:
+        limit = min(int(request.args.get('limit', LIMITE_POR_DEFECTO)), LIMITE_MAXIMO)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser entero'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit debe ser mayor que 0'}), 400
+
+    # El cursor es '<fecha_vencimiento>,<id>' del último préstamo de la página anterior
+    after = None
+    if request.args.get('after'):
+        try:
+            fecha, id = request.args['after'].rsplit(',', 1)
+            after = (datetime.fromisoformat(fecha), int(id))
+        except ValueError:
+            return jsonify({'error': 'after no es un cursor válido'}), 400
+
+    filas = leer_filas(consulta_vencidos(datetime.utcnow(), limit + 1, after))
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+
+    with metricas.medir():
+        items = serializador_filas(CAMPOS_VENCIDOS).filas(filas)
+    return jsonify({
+        'items': items,
+        'next_cursor': f'{filas[-1].fecha_vencimiento.isoformat()},{filas[-1].id}' if hay_mas else None
+    })
+
+@main_bp.route('/prestamos/<int:id>', methods=['GET'])
+@presupuesto(1)
+def obtener_prestamo(id):
+    if incluir_historial():
+        campos = tuple(COLUMNAS[Prestamo])
+        filas = leer_filas(consulta_con_historial(campos, id=id))
+        if not filas:
+            return jsonify({'error': 'Préstamo no encontrado'}), 404
+        return jsonify(serializador_filas(campos, ignorar=1).fila(filas[0]))
+    return detalle(consulta_prestamos().filter_by(id=id), Prestamo, 'Préstamo no encontrado')
 
 @main_bp.route('/prestamos', methods=['POST'])
+@presupuesto(6)
 def crear_prestamo():
     data = request.get_json()
     
@@ -123,54 +571,280 @@ def crear_prestamo():
     if not usuario_id or not libro_id:
         return jsonify({'error': 'usuario_id y libro_id son requeridos'}), 400
     
-    # Verificar que usuario existe
-    usuario = Usuario.query.get(usuario_id)
-    if not usuario:
-        return jsonify({'error': 'Usuario no encontrado'}), 404
+    # bool es subclase de int: sin excluirlo, true se tomaría como el id 1
+    if any(isinstance(x, bool) or not isinstance(x, int) for x in (usuario_id, libro_id)):
+        return jsonify({'error': 'usuario_id y libro_id deben ser enteros'}), 400
     
-    # Verificar que libro existe y está disponible
-    libro = Libro.query.get(libro_id)
-    if not libro:
+    # Descarte rápido sin consultar la BD, solo si la copia en memoria está al día
+    descarte = disponibilidad.precheck(libro_id)
+    if descarte == 'no_existe':
         return jsonify({'error': 'Libro no encontrado'}), 404
-    
-    if not libro.disponible:
+    if descarte == 'no_disponible':
         return jsonify({'error': 'Libro no disponible'}), 400
     
-    # Crear préstamo
+    respuesta, status = commit_agrupado.ejecutar(lambda: prestar(usuario_id, libro_id))
+    if status == 201:
+        versiones = cache.invalidar('libros', 'prestamos', 'usuarios') # Cambió la disponibilidad del libro y los contadores
+        disponibilidad.registrar({libro_id: False}, versiones['libros'])
+    return jsonify(respuesta), status
+
+def prestar(usuario_id, libro_id):
+    # Sentencias del préstamo, sin commit ni rollback: commit_agrupado.ejecutar confirma si status < 400
+    # (con COMMIT_AGRUPADO la transacción es compartida y cada préstamo va en su propio savepoint)
+
+    # Sumar el préstamo a los contadores del usuario, solo si no llegó al máximo de préstamos activos:
+    # la regla se evalúa en el mismo UPDATE (sin COUNT(*)) y dos peticiones simultáneas no la pasan las dos
+    maximo = current_app.config.get('MAX_PRESTAMOS_ACTIVOS', 0)
+    condiciones = [Usuario.id == usuario_id]
+    if maximo:
+        condiciones.append(Usuario.prestamos_activos < maximo)
+    usuario = db.session.scalars(
+        update(Usuario)
+        .where(*condiciones)
+        .values(prestamos_activos=Usuario.prestamos_activos + 1, total_prestamos=Usuario.total_prestamos + 1)
+        .returning(Usuario)
+        .execution_options(synchronize_session=False) # RETURNING ya trae los contadores nuevos
+    ).first()
+    
+    if not usuario:
+        if not maximo or not db.session.get(Usuario, usuario_id):
+            return {'error': 'Usuario no encontrado'}, 404
+        return {'error': f'El usuario ya tiene {maximo} préstamos activos'}, 400
+    
+    # Marcar el libro como no disponible solo si lo está, en una sola sentencia:
+    # UPDATE libros SET disponible=false WHERE id=:id AND disponible RETURNING ...
+    # Si dos peticiones compiten por el mismo libro, la base de datos deja pasar solo una
+    libro = db.session.scalars(
+        update(Libro)
+        .where(Libro.id == libro_id, Libro.disponible == True)
+        .values(disponible=False, prestamos_activos=Libro.prestamos_activos + 1, total_prestamos=Libro.total_prestamos + 1)
+        .returning(Libro)
+        .execution_options(synchronize_session=False) # RETURNING ya trae los contadores nuevos
+    ).first()
+    
+    if not libro:
+        # Solo en el camino de error se consulta para distinguir "no existe" de "no disponible"
+        # (el rollback posterior deshace también el incremento de los contadores del usuario)
+        if not db.session.get(Libro, libro_id):
+            return {'error': 'Libro no encontrado'}, 404
+        return {'error': 'Libro no disponible'}, 400
+    
+    # Crear préstamo en la misma transacción (las relaciones apuntan a los objetos ya cargados)
+    ahora = datetime.utcnow()
     prestamo = Prestamo(
-        usuario_id=usuario_id,
-        libro_id=libro_id
+        fecha_prestamo=ahora,
+        fecha_vencimiento=ahora + timedelta(days=current_app.config.get('DIAS_PRESTAMO', 14)),
+        usuario=usuario,
+        libro=libro
     )
     
-    # Marcar libro como no disponible
-    libro.disponible = False
-    
     db.session.add(prestamo)
-    db.session.commit()
-    
-    return jsonify(prestamo.to_dict()), 201
+    db.session.flush() # Asigna el id; la respuesta se arma antes del commit para no recargar objetos expirados
+    respuesta = prestamo.to_dict()
+    estadisticas.registrar_prestamo(usuario_id, libro_id, ahora) # En la misma transacción que el préstamo
+    return respuesta, 201
 
 @main_bp.route('/prestamos/<int:id>/devolver', methods=['PUT'])
+@presupuesto(4)
 def devolver_libro(id):
-    prestamo = Prestamo.query.get_or_404(id)
+    # Cerrar el préstamo solo si sigue activo, de forma atómica (dos devoluciones simultáneas no pasan las dos)
+    prestamo = db.session.scalars(
+        update(Prestamo)
+        .where(Prestamo.id == id, Prestamo.activo == True)
+        .values(activo=False, fecha_devolucion=datetime.utcnow())
+        .returning(Prestamo)
+    ).first()
     
-    if not prestamo.activo:
+    if not prestamo:
+        db.session.rollback()
+        Prestamo.query.get_or_404(id)
         return jsonify({'error': 'Este préstamo ya fue devuelto'}), 400
     
-    # Procesar devolución
-    prestamo.fecha_devolucion = datetime.utcnow()
-    prestamo.activo = False
-    
-    # Marcar libro como disponible
-    libro = Libro.query.get(prestamo.libro_id)
-    libro.disponible = True
+    # Restar el préstamo activo de los contadores y marcar el libro como disponible, en la misma transacción.
+    # Como en crear_prestamo, primero el usuario y después el libro: mismo orden de bloqueos, sin deadlocks
+    usuario = db.session.scalars(
+        update(Usuario)
+        .where(Usuario.id == prestamo.usuario_id)
+        .values(prestamos_activos=Usuario.prestamos_activos - 1)
+        .returning(Usuario)
+        .execution_options(synchronize_session=False) # RETURNING ya trae los contadores nuevos
+    ).one()
+    libro = db.session.scalars(
+        update(Libro)
+        .where(Libro.id == prestamo.libro_id)
+        .values(disponible=True, prestamos_activos=Libro.prestamos_activos - 1)
+        .returning(Libro)
+        .execution_options(synchronize_session=False) # RETURNING ya trae los contadores nuevos
+    ).one()
     
+    # El usuario y el libro quedan en el identity map (que guarda referencias débiles: por eso se
+    # conservan en variables); to_dict no hace más consultas
+    respuesta = prestamo.to_dict()
+    estadisticas.registrar_devoluciones(1, prestamo.fecha_devolucion)
     db.session.commit()
-    
-    return jsonify(prestamo.to_dict())
+    versiones = cache.invalidar('libros', 'prestamos', 'usuarios')
+    disponibilidad.registrar({respuesta['libro_id']: True}, versiones['libros'])
+
+    return jsonify(respuesta)
+
+@main_bp.route('/prestamos/devolver', methods=['PUT'])
+@presupuesto(6)
+def devolver_libros_lote():
+    # Devolución en lote: cada elemento es un id de préstamo (entero) o el ISBN del libro prestado (texto)
+    data = request.get_json()
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Se espera un arreglo JSON no vacío'}), 400
+    if len(data) > LIMITE_LOTE:
+        return jsonify({'error': f'Máximo {LIMITE_LOTE} elementos por lote'}), 400
+
+    resultados = [None] * len(data)
+
+    # Un solo SELECT para traducir los ISBN al préstamo activo de cada libro
+    isbns = {item for item in data if isinstance(item, str) and item}
+    por_isbn = {}
+    if isbns:
+        por_isbn = dict(db.session.execute(
+            select(Libro.isbn, Prestamo.id)
+            .outerjoin(Prestamo, (Prestamo.libro_id == Libro.id) & (Prestamo.activo == True))
+            .where(Libro.isbn.in_(isbns))
+        ).all())
+
+    # Índices de los elementos por préstamo a cerrar; un préstamo repetido en el lote se reporta
+    pedidos = {}
+    for i, item in enumerate(data):
+        if isinstance(item, str) and item:
+            if item not in por_isbn:
+                resultados[i] = {'indice': i, 'error': 'Libro no encontrado'}
+                continue
+            if por_isbn[item] is None:
+                resultados[i] = {'indice': i, 'error': 'El libro no tiene un préstamo activo'}
+                continue
+            prestamo_id = por_isbn[item]
+        elif isinstance(item, int) and not isinstance(item, bool):
+            prestamo_id = item
+        else:
+            resultados[i] = {'indice': i, 'error': 'Se espera un id de préstamo o un ISBN'}
+            continue
+        if prestamo_id in pedidos:
+            resultados[i] = {'indice': i, 'error': 'Préstamo repetido en el lote'}
+        else:
+            pedidos[prestamo_id] = i
+
+    devueltos = {}
+    ahora = datetime.utcnow()
+    if pedidos:
+        # Un UPDATE para todos los préstamos: solo cierra los que siguen activos (igual que la devolución individual)
+        devueltos = db.session.execute(
+            update(Prestamo)
+            .where(Prestamo.id.in_(pedidos), Prestamo.activo == True)
+            .values(activo=False, fecha_devolucion=ahora)
+            .returning(Prestamo.id, Prestamo.libro_id, Prestamo.usuario_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        usuarios = Counter(usuario_id for _, _, usuario_id in devueltos)
+        devueltos = {prestamo_id: libro_id for prestamo_id, libro_id, _ in devueltos}
+
+        # Solo en el camino de error se consulta para distinguir "no existe" de "ya fue devuelto"
+        faltantes = set(pedidos) - set(devueltos)
+        existentes = set(db.session.scalars(select(Prestamo.id).where(Prestamo.id.in_(faltantes)))) if faltantes else set()
+        for prestamo_id in faltantes:
+            error = 'Este préstamo ya fue devuelto' if prestamo_id in existentes else 'Préstamo no encontrado'
+            resultados[pedidos[prestamo_id]] = {'indice': pedidos[prestamo_id], 'error': error}
+
+    if devueltos:
+        # Un UPDATE para los contadores de todos los usuarios (a cada uno se le resta cuántos devolvió)
+        # y otro para liberar todos los libros, en la misma transacción y en el orden de crear_prestamo
+        db.session.execute(
+            update(Usuario)
+            .where(Usuario.id.in_(usuarios))
+            .values(prestamos_activos=Usuario.prestamos_activos - case(usuarios, value=Usuario.id))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(Libro)
+            .where(Libro.id.in_(set(devueltos.values())))
+            .values(disponible=True, prestamos_activos=Libro.prestamos_activos - 1) # Un libro tiene a lo sumo un préstamo activo
+            .execution_options(synchronize_session=False)
+        )
+        estadisticas.registrar_devoluciones(len(devueltos), ahora)
+        db.session.commit()
+        versiones = cache.invalidar('libros', 'prestamos', 'usuarios')
+        disponibilidad.registrar({libro_id: True for libro_id in devueltos.values()}, versiones['libros'])
+        for prestamo_id, libro_id in devueltos.items():
+            resultados[pedidos[prestamo_id]] = {'indice': pedidos[prestamo_id], 'prestamo_id': prestamo_id, 'libro_id': libro_id}
+    else:
+        db.session.rollback()
+
+    return jsonify({'devueltos': len(devueltos), 'resultados': resultados}), 200 if devueltos else 400
 
 # ============= ENDPOINT PARA LISTAR LIBROS DISPONIBLES =============
 @main_bp.route('/libros/disponibles', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('libros')
+@cache.cacheado('libros')
 def libros_disponibles():
-    libros = Libro.query.filter_by(disponible=True).all()
-    return jsonify([libro.to_dict() for libro in libros])
\ No newline at end of file
+    return listar(Libro.query.filter_by(disponible=True), Libro)
+
+@main_bp.route('/libros/disponibles/count', methods=['GET'])
+@presupuesto(1)
+def contar_libros_disponibles():
+    # Conteo desde el mapa de bits en memoria (desde la BD mientras se reconcilia, si otro proceso escribió)
+    return jsonify({'disponibles': disponibilidad.contar()})
+# ============= ESTADÍSTICAS DE CIRCULACIÓN =============
+# Se leen de las tablas resumen (app/estadisticas.py): el costo no depende del tamaño del historial
+
+CAMPOS_TOP_LIBROS = ('libro_id', 'titulo', 'autor', 'prestamos')
+CAMPOS_TOP_USUARIOS = ('usuario_id', 'nombre', 'prestamos')
+CAMPOS_POR_DIA = ('dia', 'prestamos', 'devoluciones')
+MAXIMO_DIAS = 366
+
+def ranking(consulta, campos):
+    try:
+        limit = min(int(request.args.get('limit', 10)), 100)
+    except ValueError:
+        return jsonify({'error': 'limit debe ser entero'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit debe ser mayor que 0'}), 400
+    return jsonify(serializador_filas(campos).filas(leer_filas(consulta(limit))))
+
+@main_bp.route('/estadisticas', methods=['GET'])
+@presupuesto(3)
+@cache.condicional('prestamos')
+@cache.cacheado('prestamos')
+def obtener_estadisticas():
+    # Resumen para el tablero: top 10 de libros y de usuarios, y los últimos 30 días
+    hoy = datetime.utcnow().date()
+    return jsonify({
+        'libros': serializador_filas(CAMPOS_TOP_LIBROS).filas(leer_filas(estadisticas.top_libros(10))),
+        'usuarios': serializador_filas(CAMPOS_TOP_USUARIOS).filas(leer_filas(estadisticas.top_usuarios(10))),
+        'por_dia': serializador_filas(CAMPOS_POR_DIA).filas(leer_filas(estadisticas.por_dia(hoy - timedelta(days=29), hoy))),
+    })
+
+@main_bp.route('/estadisticas/libros', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('prestamos')
+@cache.cacheado('prestamos')
+def estadisticas_libros():
+    return ranking(estadisticas.top_libros, CAMPOS_TOP_LIBROS) # Libros más prestados, ?limit= (máx. 100)
+
+@main_bp.route('/estadisticas/usuarios', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('prestamos')
+@cache.cacheado('prestamos')
+def estadisticas_usuarios():
+    return ranking(estadisticas.top_usuarios, CAMPOS_TOP_USUARIOS) # Usuarios con más préstamos
+
+@main_bp.route('/estadisticas/diarias', methods=['GET'])
+@presupuesto(1)
+@cache.condicional('prestamos')
+@cache.cacheado('prestamos')
+def estadisticas_diarias():
+    # Préstamos y devoluciones por día entre ?desde= y ?hasta= (AAAA-MM-DD, por defecto los últimos 30 días)
+    try:
+        hasta = date.fromisoformat(request.args['hasta']) if 'hasta' in request.args else datetime.utcnow().date()
+        desde = date.fromisoformat(request.args['desde']) if 'desde' in request.args else hasta - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'desde y hasta deben tener formato AAAA-MM-DD'}), 400
+    if desde > hasta or (hasta - desde).days >= MAXIMO_DIAS:
+        return jsonify({'error': f'El rango debe ser de 1 a {MAXIMO_DIAS} días'}), 400
+    return jsonify(serializador_filas(CAMPOS_POR_DIA).filas(leer_filas(estadisticas.por_dia(desde, hasta))))
@@ -0,0 +1,160 @@
+from datetime import date, datetime
+from functools import lru_cache
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider, _default
+
+from app.models import Usuario, Libro, Prestamo
+
+try:
+    import orjson
+except ImportError: # Sin orjson se usa JSONProviderEstandar
+    orjson = None
+
+
+# ============= PROVEEDORES JSON =============
+# Se elige con JSON_PROVIDER ('orjson' o 'estandar'). Los dos serializan datetime en ISO 8601
+# ('2024-01-31T10:00:00'), igual que los to_dict(), así que los serializadores pueden
+# entregar las fechas sin convertir.
+
+def _default_iso(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return _default(obj) # Decimal, UUID, dataclasses, etc. como en Flask
+
+
+class JSONProviderEstandar(DefaultJSONProvider):
+    """El proveedor de Flask (módulo json de la biblioteca estándar), con fechas en ISO 8601"""
+
+    default = staticmethod(_default_iso)
+
+
+class JSONProviderRapido(JSONProvider):
+    """Proveedor JSON con orjson: codifica en C y entrega bytes sin pasar por str.
+
+    A diferencia del proveedor de Flask no ordena las claves (quedan en el orden de
+    to_dict()) y escribe UTF-8 en lugar de escapar los caracteres no ASCII.
+    """
+
+    opciones = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default_iso, option=self.opciones).decode()
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=_default_iso, option=self.opciones)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype='application/json')
+
+
+def proveedor_json(app):
+    if app.config.get('JSON_PROVIDER', 'orjson') == 'orjson' and orjson is not None:
+        return JSONProviderRapido(app)
+    return JSONProviderEstandar(app)
+
+
+# ============= SERIALIZADORES PRECOMPILADOS =============
+
+class SerializadorFilas:
+    """Convierte filas de un select() (columnas en el orden de las claves) en dicts.
+
+    dict(zip(claves, fila)) arma cada dict en C, sin un acceso por nombre por columna.
+    ignorar: columnas extra al final de la fila que no van en la respuesta (p. ej. el id
+    para el cursor de paginación); zip se detiene en la última clave y las descarta.
+    """
+
+    def __init__(self, claves, ignorar=0):
+        self.claves = claves
+        self.ignorar = ignorar
+
+    def filas(self, filas):
+        claves = self.claves
+        return [dict(zip(claves, fila)) for fila in filas]
+
+    def fila(self, fila):
+        return dict(zip(self.claves, fila))
+
+
+class Serializador(SerializadorFilas):
+    """Como SerializadorFilas, y además convierte objetos del ORM con las mismas claves de to_dict():
+    un attrgetter con todos los atributos (creado una vez) en lugar de to_dict() e isoformat() por fila.
+    """
+
+    def __init__(self, **campos):
+        # campos: clave -> atributo del objeto ORM (se admiten rutas como 'usuario.nombre')
+        super().__init__(tuple(campos))
+        rutas = tuple(campos.values())
+        # Con un solo atributo attrgetter devuelve el valor y no una tupla
+        self.valores = attrgetter(*rutas) if len(rutas) > 1 else lambda o: (attrgetter(rutas[0])(o),)
+
+    def objeto(self, o):
+        return dict(zip(self.claves, self.valores(o)))
+
+    def objetos(self, objs):
+        claves, valores = self.claves, self.valores
+        return [dict(zip(claves, valores(o))) for o in objs]
+
+
+@lru_cache(maxsize=256)
+def serializador_filas(claves, ignorar=0):
+    """SerializadorFilas compartido por cada combinación de ?fields="""
+    return SerializadorFilas(claves, ignorar)
+
+
+SERIALIZADORES = {
+    Usuario: Serializador(id='id', nombre='nombre', email='email',
+                          prestamos_activos='prestamos_activos', total_prestamos='total_prestamos'),
+    Libro: Serializador(id='id', titulo='titulo', autor='autor', isbn='isbn', disponible='disponible',
+                        prestamos_activos='prestamos_activos', total_prestamos='total_prestamos'),
+    Prestamo: Serializador(
+        id='id', usuario_id='usuario_id', libro_id='libro_id',
+        usuario_nombre='usuario.nombre', libro_titulo='libro.titulo',
+        fecha_prestamo='fecha_prestamo', fecha_vencimiento='fecha_vencimiento', fecha_devolucion='fecha_devolucion', activo='activo',
+    ),
+}
+
+
+# ============= PROYECCIÓN DE COLUMNAS (?fields=) =============
+
+# Campos de la respuesta de cada modelo y la columna que los produce
+COLUMNAS = {
+    Usuario: {'id': Usuario.id, 'nombre': Usuario.nombre, 'email': Usuario.email,
+              'prestamos_activos': Usuario.prestamos_activos, 'total_prestamos': Usuario.total_prestamos},
+    Libro: {'id': Libro.id, 'titulo': Libro.titulo, 'autor': Libro.autor, 'isbn': Libro.isbn, 'disponible': Libro.disponible,
+            'prestamos_activos': Libro.prestamos_activos, 'total_prestamos': Libro.total_prestamos},
+    Prestamo: {
+        'id': Prestamo.id, 'usuario_id': Prestamo.usuario_id, 'libro_id': Prestamo.libro_id,
+        'usuario_nombre': Usuario.nombre, 'libro_titulo': Libro.titulo,
+        'fecha_prestamo': Prestamo.fecha_prestamo, 'fecha_vencimiento': Prestamo.fecha_vencimiento,
+        'fecha_devolucion': Prestamo.fecha_devolucion, 'activo': Prestamo.activo,
+    },
+}
+
+# Campos que vienen de otra tabla: relación por la que se hace el JOIN
+UNIONES = {
+    Prestamo: {'usuario_nombre': Prestamo.usuario, 'libro_titulo': Prestamo.libro},
+}
+
+
+def proyectar(query, modelo, campos, cursor=False):
+    """La misma consulta (Query o select), pero trayendo solo las columnas de campos como filas (sin objetos ORM).
+
+    Con cursor=True se agrega modelo.id al final, para armar next_cursor aunque no se haya pedido.
+    Puede agregar JOIN, así que se aplica antes de limit()/offset().
+    """
+    columnas = [COLUMNAS[modelo][campo] for campo in campos]
+    if cursor:
+        columnas.append(modelo.id)
+    if hasattr(query, 'with_entities'):
+        query = query.with_entities(*columnas)
+    else:
+        query = query.with_only_columns(*columnas) # select() de Core/2.0 (p. ej. la búsqueda de texto)
+    for campo, relacion in UNIONES.get(modelo, {}).items():
+        if campo in campos:
+            query = query.join(relacion)
+    return query
@@ -0,0 +1,34 @@
+from sqlalchemy import Integer, cast, extract, func, literal, select, tuple_
+from sqlalchemy.types import DateTime
+
+from app.models import db, Usuario, Libro, Prestamo
+
+# Préstamos activos cuya fecha de vencimiento ya pasó, con los días de atraso calculados en SQL.
+# Se recorren en orden de vencimiento (el más atrasado primero) sobre el índice parcial
+# ix_prestamos_vencimiento (fecha_vencimiento, id) WHERE activo: la consulta lee solo el
+# rango vencido y la página pedida, sin importar cuántos préstamos haya en la tabla.
+
+CAMPOS = ('id', 'usuario_id', 'usuario_nombre', 'libro_id', 'libro_titulo',
+          'fecha_prestamo', 'fecha_vencimiento', 'dias_atraso')
+
+
+def dias_de_atraso(ahora):
+    """Expresión SQL con los días completos entre fecha_vencimiento y ahora, según el motor"""
+    ahora = literal(ahora, DateTime)
+    if db.engine.dialect.name == 'sqlite':
+        return cast(func.julianday(ahora) - func.julianday(Prestamo.fecha_vencimiento), Integer)
+    return cast(func.floor(extract('epoch', ahora - Prestamo.fecha_vencimiento) / 86400), Integer)
+
+
+def consulta_vencidos(ahora, limit, after=None):
+    """select() de una página de préstamos vencidos; after es (fecha_vencimiento, id) del último de la anterior"""
+    consulta = (select(Prestamo.id, Prestamo.usuario_id, Usuario.nombre, Prestamo.libro_id, Libro.titulo,
+                       Prestamo.fecha_prestamo, Prestamo.fecha_vencimiento, dias_de_atraso(ahora))
+                .join(Usuario, Usuario.id == Prestamo.usuario_id)
+                .join(Libro, Libro.id == Prestamo.libro_id)
+                .where(Prestamo.activo == True, Prestamo.fecha_vencimiento < ahora)
+                .order_by(Prestamo.fecha_vencimiento, Prestamo.id)
+                .limit(limit))
+    if after is not None:
+        consulta = consulta.where(tuple_(Prestamo.fecha_vencimiento, Prestamo.id) > tuple_(*after))
+    return consulta
@@ -0,0 +1,76 @@
+# gunicorn.conf.py - Servidor de producción (multi-proceso) para la API
+# Uso: gunicorn -c gunicorn.conf.py run:app
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('WEB_BIND') or '0.0.0.0:5000'
+
+# Procesos (prefork) y hilos por proceso; cada hilo atiende una petición a la vez.
+# DB_POOL_SIZE + DB_MAX_OVERFLOW debería ser >= WEB_THREADS para que los hilos no esperen conexión
+workers = int(os.environ.get('WEB_WORKERS') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('WEB_THREADS') or 4)
+worker_class = 'gthread'
+
+# Carga create_app una sola vez en el proceso maestro antes de hacer fork (arranque más rápido, memoria compartida)
+preload_app = True
+
+# Recicla cada worker tras N peticiones (con jitter para que no se reinicien todos a la vez)
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS') or 1000)
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER') or 100)
+
+# Apagado ordenado: al recibir SIGTERM los workers terminan las peticiones en curso durante este tiempo
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT') or 30)
+timeout = int(os.environ.get('WEB_TIMEOUT') or 30)
+
+accesslog = '-'
+errorlog = '-'
+
+# Cada worker tiene sus propios contadores: /metrics los suma desde este directorio (ver app/metricas.py).
+# Se fija antes de cargar la app para que config.py lo lea
+os.environ.setdefault('METRICAS_DIR', os.path.join(tempfile.gettempdir(), f'biblioteca-metricas-{os.getpid()}'))
+
+
+def on_starting(server):
+    # Directorio vacío en cada arranque: no se suman contadores de una ejecución anterior
+    shutil.rmtree(os.environ['METRICAS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICAS_DIR'])
+
+
+def when_ready(server):
+    # Con preload_app el maestro ya tiene la app: el índice de autocompletado se construye
+    # una vez aquí y los workers lo heredan al hacer fork
+    from run import app
+    from app.autocompletar import autocompletar
+    with app.app_context():
+        try:
+            autocompletar.construir()
+        except Exception:
+            server.log.exception('No se pudo precargar el índice de autocompletado; se construirá en la primera búsqueda')
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas en el maestro no se pueden compartir entre procesos:
+    # cada worker empieza con un pool vacío
+    from run import app
+    from app.models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Últimos contadores del worker antes de salir (reciclado por max_requests o apagado)
+    from run import app
+    from app.metricas import metricas
+    with app.app_context():
+        metricas.volcar()
+
+
+def child_exit(server, worker):
+    # En el maestro, con el worker ya terminado: sus contadores pasan al acumulado de los terminados
+    from app.metricas import retirar_proceso
+    try:
+        retirar_proceso(os.environ['METRICAS_DIR'], worker.pid)
+    except OSError:
+        server.log.exception('No se pudieron acumular las métricas del worker %s', worker.pid)
@@ -0,0 +1,63 @@
+"""busqueda de texto completo en libros
+
+PostgreSQL: columna generada libros.busqueda (tsvector) con índice GIN.
+SQLite: tabla FTS5 libros_fts sincronizada por triggers. Ver app/busqueda.py.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:05:12.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# Copia de app/busqueda.py al momento de esta revisión: la migración no debe cambiar si cambia la app
+DDL_POSTGRESQL = [
+    """ALTER TABLE libros ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(autor, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_libros_busqueda ON libros USING GIN (busqueda)",
+]
+
+DDL_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS libros_fts USING fts5(titulo, autor, tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS libros_fts_ai AFTER INSERT ON libros BEGIN
+        INSERT INTO libros_fts(rowid, titulo, autor) VALUES (new.id, new.titulo, new.autor);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS libros_fts_au AFTER UPDATE OF titulo, autor ON libros BEGIN
+        UPDATE libros_fts SET titulo = new.titulo, autor = new.autor WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS libros_fts_ad AFTER DELETE ON libros BEGIN
+        DELETE FROM libros_fts WHERE rowid = old.id;
+    END""",
+]
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        for sentencia in DDL_POSTGRESQL:
+            op.execute(sentencia)
+    elif dialecto == 'sqlite':
+        for sentencia in DDL_SQLITE:
+            op.execute(sentencia)
+        op.execute('INSERT INTO libros_fts(rowid, titulo, autor) SELECT id, titulo, autor FROM libros')
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_libros_busqueda')
+        op.execute('ALTER TABLE libros DROP COLUMN IF EXISTS busqueda')
+    elif dialecto == 'sqlite':
+        for trigger in ('libros_fts_ai', 'libros_fts_au', 'libros_fts_ad'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS libros_fts')
@@ -0,0 +1,37 @@
+"""fecha de vencimiento de los prestamos
+
+Los préstamos existentes vencen a los 14 días de prestados (DIAS_PRESTAMO por defecto).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:20:41.903118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('prestamos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fecha_vencimiento', sa.DateTime(), nullable=True))
+
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE prestamos SET fecha_vencimiento = datetime(fecha_prestamo, '+14 days')")
+    else:
+        op.execute("UPDATE prestamos SET fecha_vencimiento = fecha_prestamo + INTERVAL '14 days'")
+
+    with op.batch_alter_table('prestamos', schema=None) as batch_op:
+        batch_op.create_index('ix_prestamos_vencimiento', ['fecha_vencimiento', 'id'], unique=False, postgresql_where=sa.text('activo = true'), sqlite_where=sa.text('activo = 1'))
+
+
+def downgrade():
+    with op.batch_alter_table('prestamos', schema=None) as batch_op:
+        batch_op.drop_index('ix_prestamos_vencimiento', postgresql_where=sa.text('activo = true'), sqlite_where=sa.text('activo = 1'))
+        batch_op.drop_column('fecha_vencimiento')
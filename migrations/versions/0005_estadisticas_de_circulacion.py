@@ -0,0 +1,69 @@
+"""estadisticas de circulacion
+
+Tablas resumen que mantienen los préstamos y devoluciones (ver app/estadisticas.py).
+Se llenan una sola vez aquí a partir del historial existente.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:58:07.214630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('estadisticas_libros',
+    sa.Column('libro_id', sa.Integer(), nullable=False),
+    sa.Column('prestamos', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['libro_id'], ['libros.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('libro_id')
+    )
+    with op.batch_alter_table('estadisticas_libros', schema=None) as batch_op:
+        batch_op.create_index('ix_estadisticas_libros_ranking', ['prestamos', 'libro_id'], unique=False)
+
+    op.create_table('estadisticas_usuarios',
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('prestamos', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('usuario_id')
+    )
+    with op.batch_alter_table('estadisticas_usuarios', schema=None) as batch_op:
+        batch_op.create_index('ix_estadisticas_usuarios_ranking', ['prestamos', 'usuario_id'], unique=False)
+
+    op.create_table('estadisticas_diarias',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('prestamos', sa.Integer(), nullable=False),
+    sa.Column('devoluciones', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia')
+    )
+
+    # Llenado inicial con el historial (la única vez que se agrupa sobre prestamos)
+    dia = 'date({})' if op.get_bind().dialect.name == 'sqlite' else 'CAST({} AS DATE)'
+    op.execute('INSERT INTO estadisticas_libros (libro_id, prestamos) SELECT libro_id, count(*) FROM prestamos GROUP BY libro_id')
+    op.execute('INSERT INTO estadisticas_usuarios (usuario_id, prestamos) SELECT usuario_id, count(*) FROM prestamos GROUP BY usuario_id')
+    op.execute(f"""
+        INSERT INTO estadisticas_diarias (dia, prestamos, devoluciones)
+        SELECT dia, sum(prestamos), sum(devoluciones) FROM (
+            SELECT {dia.format('fecha_prestamo')} AS dia, 1 AS prestamos, 0 AS devoluciones FROM prestamos
+            UNION ALL
+            SELECT {dia.format('fecha_devolucion')}, 0, 1 FROM prestamos WHERE fecha_devolucion IS NOT NULL
+        ) AS movimientos GROUP BY dia
+    """)
+
+
+def downgrade():
+    op.drop_table('estadisticas_diarias')
+    with op.batch_alter_table('estadisticas_usuarios', schema=None) as batch_op:
+        batch_op.drop_index('ix_estadisticas_usuarios_ranking')
+    op.drop_table('estadisticas_usuarios')
+    with op.batch_alter_table('estadisticas_libros', schema=None) as batch_op:
+        batch_op.drop_index('ix_estadisticas_libros_ranking')
+    op.drop_table('estadisticas_libros')
@@ -0,0 +1,40 @@
+"""contadores de prestamos en usuarios y libros
+
+prestamos_activos y total_prestamos se mantienen al prestar y devolver (app/routes.py).
+Se llenan aquí a partir del historial; después, `flask reconciliar-contadores` corrige desfases.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:41:12.508331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for tabla, llave in (('usuarios', 'usuario_id'), ('libros', 'libro_id')):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('prestamos_activos', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('total_prestamos', sa.Integer(), server_default='0', nullable=False))
+
+        activo = '1' if op.get_bind().dialect.name == 'sqlite' else 'true'
+        op.execute(f"""
+            UPDATE {tabla} SET
+                prestamos_activos = (SELECT count(*) FROM prestamos WHERE prestamos.{llave} = {tabla}.id AND prestamos.activo = {activo}),
+                total_prestamos = (SELECT count(*) FROM prestamos WHERE prestamos.{llave} = {tabla}.id)
+        """)
+
+
+def downgrade():
+    for tabla in ('libros', 'usuarios'):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.drop_column('total_prestamos')
+            batch_op.drop_column('prestamos_activos')
@@ -0,0 +1,59 @@
+"""prestamos archivados
+
+Tabla fría para los préstamos devueltos hace más de ARCHIVO_DIAS (ver app/archivo.py y
+`flask archivar-prestamos`). En SQLite, prestamos se recrea con AUTOINCREMENT para que los
+ids de los préstamos archivados no se reutilicen.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:22:37.915604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+COLUMNAS = 'id, usuario_id, libro_id, fecha_prestamo, fecha_vencimiento, fecha_devolucion'
+
+
+def upgrade():
+    op.create_table('prestamos_archivados',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('libro_id', sa.Integer(), nullable=False),
+    sa.Column('fecha_prestamo', sa.DateTime(), nullable=True),
+    sa.Column('fecha_vencimiento', sa.DateTime(), nullable=True),
+    sa.Column('fecha_devolucion', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['libro_id'], ['libros.id'], ),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('prestamos_archivados', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_prestamos_archivados_libro_id'), ['libro_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_prestamos_archivados_usuario_id'), ['usuario_id'], unique=False)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('prestamos', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+
+def downgrade():
+    # Los archivados vuelven a prestamos (como devueltos) para no perder historial
+    activo = '0' if op.get_bind().dialect.name == 'sqlite' else 'false'
+    op.execute(f'INSERT INTO prestamos ({COLUMNAS}, activo) SELECT {COLUMNAS}, {activo} FROM prestamos_archivados')
+
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('prestamos', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
+
+    with op.batch_alter_table('prestamos_archivados', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_prestamos_archivados_usuario_id'))
+        batch_op.drop_index(batch_op.f('ix_prestamos_archivados_libro_id'))
+
+    op.drop_table('prestamos_archivados')
@@ -1,7 +1,7 @@
 from app import create_app # Se importa de __init__.py donde se define la función create_app
 from app.models import db
 
-app = create_app()
+app = create_app() # Producción: gunicorn -c gunicorn.conf.py run:app (servidor multi-proceso)
 
 if __name__ == '__main__':  # Solo se ejecuta si corres este archivo directamente
 # Esto significa: Si ejecutas python run.py, se ejecuta el código dentro del if.
@@ -10,5 +10,5 @@ if __name__ == '__main__':  # Solo se ejecuta si corres este archivo directament
         db.create_all()
         print("Base de datos inicializada")
     
-    print("Servidor iniciando en http://127.0.0.1:5000")
+    print("Servidor de desarrollo iniciando en http://127.0.0.1:5000")
     app.run(host='127.0.0.1', port=5000) # Inicia el servidor web
\ No newline at end of file
@@ -0,0 +1,33 @@
+# locustfile_pico.py - Pico de escrituras para comparar COMMIT_AGRUPADO
+# Va aparte de locustfile.py para no cambiar la mezcla de carga que corre el CI
+from locust import HttpUser, task, between
+import uuid
+
+class UsuarioRegistroPico(HttpUser):
+    """
+    Pico de altas: POST /usuarios y POST /prestamos sin pausa, para comparar el throughput de
+    escritura con COMMIT_AGRUPADO=false (un commit por petición) y COMMIT_AGRUPADO=true.
+    Uso: locust -f tests/carga-estres/locustfile_pico.py --headless -u 64 -r 64 -t 30s --host ...
+    """
+    wait_time = between(0, 0.01)
+
+    def on_start(self):
+        self.usuario_id = None
+        response = self.client.post("/usuarios", json={"nombre": "Lector pico", "email": f"pico{uuid.uuid4().hex}@test.com"},
+                                    name="Crear Usuario Inicial")
+        if response.status_code == 201:
+            self.usuario_id = response.json()['id']
+
+    @task(3)
+    def registrar_usuario(self):
+        self.client.post("/usuarios", json={"nombre": "Registro pico", "email": f"registro{uuid.uuid4().hex}@test.com"},
+                         name="Crear Usuario (pico)")
+
+    @task(1)
+    def prestar_libro_nuevo(self):
+        """Crea un libro y lo presta: el POST /prestamos es el que se mide"""
+        response = self.client.post("/libros", json={"titulo": "Libro pico", "autor": "Autor pico", "isbn": uuid.uuid4().hex[:13]},
+                                    name="Crear Libro (pico)")
+        if response.status_code == 201 and self.usuario_id:
+            self.client.post("/prestamos", json={"usuario_id": self.usuario_id, "libro_id": response.json()['id']},
+                             name="Crear Préstamo (pico)")
@@ -6,7 +6,10 @@
 import pytest
 import uuid
 from app import create_app
-from app.models import db, Usuario, Libro, Prestamo
+from app.models import db, Usuario, Libro, Prestamo, PrestamoArchivado, EstadisticaLibro, EstadisticaUsuario, EstadisticaDiaria
+from app.cache import cache
+from app.autocompletar import autocompletar
+from app.disponibilidad import disponibilidad
 from config import TestConfig # Importa para tener la configuracion de pruebas
 
 @pytest.fixture(scope='session') # Se ejecuta una vez por toda la sesión de pruebas
@@ -25,10 +28,17 @@ def client(app): # Recibe la app creada por el fixture app
 @pytest.fixture(autouse=True) # Se ejecuta antes y después de cada test automaticamente
 def clean_db(app):
     with app.app_context():
+        db.create_all() # Por si otro módulo (tests/rendimiento/test_performance.py) eliminó las tablas al terminar
         db.session.query(Prestamo).delete()
+        db.session.query(PrestamoArchivado).delete()
+        for estadistica in (EstadisticaLibro, EstadisticaUsuario, EstadisticaDiaria):
+            db.session.query(estadistica).delete()
         db.session.query(Libro).delete()
         db.session.query(Usuario).delete()
         db.session.commit()
+        cache.invalidar('usuarios', 'libros', 'prestamos') # Los borrados directos no pasan por las rutas, así que se invalida a mano
+        autocompletar.reiniciar()
+        disponibilidad.reiniciar()
         yield #  pausa, deja que el test se ejecute con BD limpia
         db.session.rollback()  #deshace cambios no confirmados (red de seguridad)
 
@@ -113,4 +113,908 @@ def test_flujo_completo_prestamo_devolucion(client):
     response = client.get('/libros/disponibles')
     libros_disponibles = json.loads(response.data)
     libro_ids = [l['id'] for l in libros_disponibles]
-    assert libro['id'] in libro_ids
\ No newline at end of file
+    assert libro['id'] in libro_ids
+
+# ============= PRUEBAS DE PAGINACIÓN POR CURSOR =============
+
+def test_paginacion_por_cursor_libros(client):
+    """Test 7: Recorrer /libros por páginas con ?limit= y ?after="""
+    with client.application.app_context():
+        for i in range(5):
+            db.session.add(Libro(titulo=f'Libro {i}', autor='Autor', isbn=f'978000000000{i}'))
+        db.session.commit()
+
+    response = client.get('/libros?limit=2')
+    assert response.status_code == 200
+    pagina = json.loads(response.data)
+    assert len(pagina['items']) == 2
+    assert pagina['next_cursor'] == pagina['items'][-1]['id']
+
+    vistos = [l['id'] for l in pagina['items']]
+    while pagina['next_cursor'] is not None:
+        response = client.get(f'/libros?limit=2&after={pagina["next_cursor"]}')
+        pagina = json.loads(response.data)
+        vistos.extend(l['id'] for l in pagina['items'])
+
+    assert len(vistos) == 5
+    assert vistos == sorted(vistos)
+
+def test_paginacion_parametros_invalidos(client):
+    """Test 8: Parámetros de paginación inválidos"""
+    assert client.get('/usuarios?limit=abc').status_code == 400
+    assert client.get('/prestamos?limit=0').status_code == 400
+
+
+# ============= PRUEBAS DE NÚMERO DE CONSULTAS (N+1) =============
+
+def contar_consultas(app, peticion):
+    """Ejecuta la petición y devuelve (respuesta, número de sentencias SQL emitidas)"""
+    from sqlalchemy import event
+    sentencias = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', registrar)
+    try:
+        response = peticion()
+    finally:
+        event.remove(engine, 'before_cursor_execute', registrar)
+    return response, len(sentencias)
+
+def test_listado_prestamos_numero_constante_de_consultas(client):
+    """Test 9: GET /prestamos emite las mismas consultas con 1 o con 10 préstamos"""
+    with client.application.app_context():
+        for i in range(10):
+            usuario = Usuario(nombre=f'Usuario {i}', email=f'n1_{i}@test.com')
+            libro = Libro(titulo=f'Libro {i}', autor='Autor', isbn=f'978111111111{i}')
+            db.session.add(Prestamo(usuario=usuario, libro=libro))
+        db.session.commit()
+
+    response, consultas = contar_consultas(client.application, lambda: client.get('/prestamos'))
+    assert response.status_code == 200
+    assert len(json.loads(response.data)) == 10
+    assert consultas == 1
+
+
+# ============= PRUEBAS DE RESPUESTAS EN STREAMING =============
+
+def test_streaming_arreglo_json_y_ndjson(client, sample_usuario, sample_libro):
+    """Test 10: /libros y /prestamos en modo streaming (JSON y NDJSON)"""
+    response = client.get('/libros?stream=1')
+    assert response.status_code == 200
+    assert response.is_streamed
+    libros = json.loads(response.data)
+    assert [l['id'] for l in libros] == [sample_libro.id]
+
+    data = {"usuario_id": sample_usuario.id, "libro_id": sample_libro.id}
+    client.post('/prestamos', data=json.dumps(data), content_type='application/json')
+
+    response = client.get('/prestamos', headers={'Accept': 'application/x-ndjson'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lineas = response.data.decode().splitlines()
+    assert len(lineas) == 1
+    assert json.loads(lineas[0])['usuario_nombre'] == sample_usuario.nombre
+
+    response = client.get('/usuarios?stream=1')
+    assert json.loads(response.data)[0]['email'] == sample_usuario.email
+
+
+# ============= PRUEBAS DE CACHE DEL CATÁLOGO =============
+
+def test_cache_catalogo_hit_miss_e_invalidacion(client, sample_usuario, sample_libro):
+    """Test 11: /libros y /libros/disponibles se sirven de cache y se invalidan con escrituras"""
+    from app.cache import cache
+
+    with client.application.app_context():
+        cache.invalidar('libros') # Empieza con una versión limpia
+        stats = cache.estadisticas
+        hits, misses = stats['hits'], stats['misses']
+
+    client.get('/libros/disponibles')
+    response, consultas = contar_consultas(client.application, lambda: client.get('/libros/disponibles'))
+    assert consultas == 0
+    assert len(json.loads(response.data)) == 1
+    assert (stats['hits'] - hits, stats['misses'] - misses) == (1, 1)
+
+    # Prestar el libro invalida la cache: ya no aparece como disponible
+    data = {"usuario_id": sample_usuario.id, "libro_id": sample_libro.id}
+    client.post('/prestamos', data=json.dumps(data), content_type='application/json')
+    response = client.get('/libros/disponibles')
+    assert json.loads(response.data) == []
+
+    client.put(f'/libros/{sample_libro.id}', data=json.dumps({"titulo": "Otro"}), content_type='application/json')
+    response = client.get('/libros')
+    assert json.loads(response.data)[0]['titulo'] == 'Otro'
+
+
+# ============= PRUEBAS DE GET CONDICIONALES (ETAG) =============
+
+def test_etag_304_sin_consultas_y_cambio_tras_escritura(client, sample_usuario):
+    """Test 12: If-None-Match responde 304 sin tocar la BD hasta que hay una escritura"""
+    response = client.get('/usuarios')
+    etag = response.headers['ETag']
+    assert etag
+
+    response, consultas = contar_consultas(client.application,
+                                           lambda: client.get('/usuarios', headers={'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert consultas == 0
+
+    data = {"nombre": "Nuevo", "email": "etag@test.com"}
+    client.post('/usuarios', data=json.dumps(data), content_type='application/json')
+
+    response = client.get('/usuarios', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(json.loads(response.data)) == 2
+
+class BackendCaido:
+    """Se comporta como RedisBackend cuando Redis no responde: lee None y no guarda nada"""
+
+    def get(self, clave):
+        return None
+
+    def add(self, clave, valor):
+        pass
+
+    def set(self, clave, valor, ttl):
+        pass
+
+    def incr(self, clave):
+        return None
+
+def test_sin_version_no_hay_etag_ni_cache(app, client, sample_libro):
+    """Test 34: si la versión no se puede leer (backend caído) se responde 200 sin ETag ni cache, nunca datos viejos"""
+    backend = app.extensions['cache']
+    app.extensions['cache'] = BackendCaido()
+    try:
+        response = client.get('/libros', headers={'If-None-Match': '"libros-0"'})
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+
+        client.post('/libros', data=json.dumps({"titulo": "Nuevo", "autor": "Autor", "isbn": "1112223334445"}),
+                    content_type='application/json')
+        response = client.get('/libros', headers={'If-None-Match': '"libros-0"'})
+        assert response.status_code == 200
+        assert len(json.loads(response.data)) == 2
+    finally:
+        app.extensions['cache'] = backend
+
+
+def test_backend_vaciado_no_repite_etags(app, client, sample_libro):
+    """Test 40: si el backend se vacía (Redis reiniciado) las escrituras no reemiten ETags ya entregados"""
+    def escribir(titulo):
+        client.put(f'/libros/{sample_libro.id}', data=json.dumps({"titulo": titulo}), content_type='application/json')
+
+    app.extensions['cache']._datos.clear()
+    escribir('Primera')
+    etag = client.get('/libros').headers['ETag']
+
+    app.extensions['cache']._datos.clear()
+    escribir('Segunda')
+    response = client.get('/libros', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data)[0]['titulo'] == 'Segunda'
+
+
+# ============= PRUEBAS DE CREACIÓN EN LOTE =============
+
+def test_crear_libros_bulk_resultados_por_elemento(client, sample_libro):
+    """Test 13: POST /libros/bulk crea los válidos y reporta errores por elemento"""
+    data = [
+        {"titulo": "Lote 1", "autor": "Autor", "isbn": "9780000000001"},
+        {"titulo": "Lote 2", "autor": "Autor"},                          # Falta ISBN
+        {"titulo": "Lote 3", "autor": "Autor", "isbn": sample_libro.isbn}, # Ya existe en BD
+        {"titulo": "Lote 4", "autor": "Autor", "isbn": "9780000000001"},  # Repetido en el lote
+        {"titulo": "Lote 5", "autor": "Autor", "isbn": "9780000000005"},
+        {"titulo": "Lote 6", "autor": "Autor", "isbn": ["9780000000006"]}, # No es texto
+        {"titulo": "Lote 7", "autor": "Autor", "isbn": "9" * 40},           # Más largo que la columna
+    ]
+    response = client.post('/libros/bulk', data=json.dumps(data), content_type='application/json')
+    assert response.status_code == 201
+    cuerpo = json.loads(response.data)
+    assert cuerpo['creados'] == 2
+    resultados = cuerpo['resultados']
+    assert 'isbn es requerido' in resultados[1]['error']
+    assert resultados[2]['error'] == 'ISBN ya existe'
+    assert resultados[3]['error'] == 'ISBN ya existe'
+    assert resultados[5]['error'] == 'isbn debe ser texto'
+    assert resultados[6]['error'] == 'isbn admite como máximo 13 caracteres'
+
+    libros = {l['id']: l for l in json.loads(client.get('/libros').data)}
+    assert libros[resultados[0]['id']]['titulo'] == 'Lote 1'
+    assert libros[resultados[4]['id']]['titulo'] == 'Lote 5'
+
+def test_crear_usuarios_bulk(client):
+    """Test 14: POST /usuarios/bulk"""
+    data = [{"nombre": f"Usuario {i}", "email": f"bulk{i}@test.com"} for i in range(3)]
+    response = client.post('/usuarios/bulk', data=json.dumps(data), content_type='application/json')
+    assert response.status_code == 201
+    assert json.loads(response.data)['creados'] == 3
+
+    response = client.post('/usuarios/bulk', data=json.dumps(data), content_type='application/json')
+    assert response.status_code == 400
+    assert client.post('/usuarios/bulk', data=json.dumps({}), content_type='application/json').status_code == 400
+
+def test_crear_bulk_carrera_devuelve_409(client, sample_usuario, monkeypatch):
+    """Test 35: si otra petición crea el mismo email entre el SELECT y el INSERT, el lote responde 409 sin crear nada"""
+    from sqlalchemy import false, select
+    from app import routes
+    # El SELECT de duplicados no encuentra nada, como si la otra petición aún no hubiera confirmado
+    monkeypatch.setattr(routes, 'select', lambda columna: select(columna).where(false()))
+    data = [{"nombre": "Nuevo", "email": "nuevo@test.com"}, {"nombre": "Otro", "email": sample_usuario.email}]
+    response = client.post('/usuarios/bulk', data=json.dumps(data), content_type='application/json')
+    assert response.status_code == 409
+    assert db.session.query(Usuario).filter_by(email='nuevo@test.com').count() == 0
+
+
+# ============= PRUEBAS DE CONCURRENCIA EN PRÉSTAMOS =============
+
+def test_prestamo_concurrente_un_solo_exito(client, sample_libro):
+    """Test 15: Muchos hilos piden el mismo libro a la vez y solo uno lo obtiene"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    hilos = 8
+    with client.application.app_context():
+        usuarios = [Usuario(nombre=f'Concurrente {i}', email=f'concurrente{i}@test.com') for i in range(hilos)]
+        db.session.add_all(usuarios)
+        db.session.commit()
+        usuario_ids = [u.id for u in usuarios]
+
+    def pedir(usuario_id):
+        cliente = client.application.test_client() # Cada hilo con su propio cliente y sesión
+        data = {"usuario_id": usuario_id, "libro_id": sample_libro.id}
+        return cliente.post('/prestamos', data=json.dumps(data), content_type='application/json').status_code
+
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        codigos = list(executor.map(pedir, usuario_ids))
+
+    assert codigos.count(201) == 1
+    assert codigos.count(400) == hilos - 1
+
+    with client.application.app_context():
+        assert Prestamo.query.filter_by(libro_id=sample_libro.id, activo=True).count() == 1
+
+
+# ============= PRUEBAS DE MÉTRICAS DEL POOL =============
+
+def test_metricas_pool(client, sample_usuario):
+    """Test 16: /health/pool reporta las conexiones entregadas por el pool"""
+    antes = json.loads(client.get('/health/pool').data)['checkouts']
+    client.get('/usuarios')
+    metricas = json.loads(client.get('/health/pool').data)
+    assert metricas['checkouts'] > antes
+    assert metricas['en_uso_max'] >= 1
+    assert metricas['timeouts'] == 0
+
+def test_metricas_pool_despues_de_dispose(client, sample_usuario):
+    """Test 36: Tras dispose() (post_fork de gunicorn) las métricas siguen al pool nuevo"""
+    with client.application.app_context():
+        db.engine.dispose(close=False)
+    metricas = json.loads(client.get('/health/pool').data)
+    assert metricas['checkouts'] == 0 # Lo contado con el pool anterior no cuenta para el nuevo
+    client.get('/usuarios')
+    metricas = json.loads(client.get('/health/pool').data)
+    assert metricas['checkouts'] >= 1
+    assert metricas['conexiones_nuevas'] >= 1
+    assert metricas['espera_max_ms'] > 0
+
+
+# ============= PRUEBAS DEL DETALLE POR ID =============
+
+def test_detalle_igual_que_listado(client, sample_usuario, sample_libro):
+    """Test 17: GET /usuarios/<id>, /libros/<id> y /prestamos/<id> devuelven el mismo elemento que el listado"""
+    data = {"usuario_id": sample_usuario.id, "libro_id": sample_libro.id}
+    prestamo = json.loads(client.post('/prestamos', data=json.dumps(data), content_type='application/json').data)
+
+    for listado, id in [('/usuarios', sample_usuario.id), ('/libros', sample_libro.id), ('/prestamos', prestamo['id'])]:
+        esperado = next(e for e in json.loads(client.get(listado).data) if e['id'] == id)
+        assert json.loads(client.get(f'{listado}/{id}').data) == esperado, listado
+
+    assert client.get('/usuarios/999999').status_code == 404
+
+
+# ============= PRUEBAS DE BÚSQUEDA DE TEXTO COMPLETO =============
+
+def test_buscar_libros_relevancia_y_sincronizacion(client):
+    """Test 18: /libros/buscar ordena por relevancia y refleja altas, cambios y bajas"""
+    data = [
+        {"titulo": "Cien años de soledad", "autor": "Gabriel García Márquez", "isbn": "9780000000101"},
+        {"titulo": "El amor en los tiempos del cólera", "autor": "Gabriel García Márquez", "isbn": "9780000000102"},
+        {"titulo": "Rayuela", "autor": "Julio Cortázar", "isbn": "9780000000103"},
+    ]
+    ids = [r['id'] for r in json.loads(client.post('/libros/bulk', data=json.dumps(data), content_type='application/json').data)['resultados']]
+
+    response = client.get('/libros/buscar?q=soledad')
+    assert response.status_code == 200
+    assert [l['id'] for l in json.loads(response.data)] == [ids[0]]
+
+    # Coincidencia en el título pesa más que en el autor
+    client.put(f'/libros/{ids[2]}', data=json.dumps({"titulo": "Gabriel"}), content_type='application/json')
+    resultados = [l['id'] for l in json.loads(client.get('/libros/buscar?q=gabriel').data)]
+    assert resultados[0] == ids[2]
+    assert set(resultados) == set(ids)
+
+    client.delete(f'/libros/{ids[0]}')
+    assert json.loads(client.get('/libros/buscar?q=soledad').data) == []
+    assert client.get('/libros/buscar?q=').status_code == 400
+    assert client.get('/libros/buscar?q=gabriel&limit=-1').status_code == 400
+    assert client.get('/libros/buscar?q=gabriel&limit=0').status_code == 400
+
+
+# ============= PRUEBAS DE AUTOCOMPLETADO =============
+
+def test_autocompletar_titulos_y_autores(client):
+    """Test 19: /libros/autocompletar sugiere por prefijo y se actualiza con altas, cambios y bajas"""
+    data = [
+        {"titulo": "Cien años de soledad", "autor": "Gabriel García Márquez", "isbn": "9780000000201"},
+        {"titulo": "Crónica de una muerte anunciada", "autor": "Gabriel García Márquez", "isbn": "9780000000202"},
+        {"titulo": "Ciudades de papel", "autor": "John Green", "isbn": "9780000000203"},
+    ]
+    ids = [r['id'] for r in json.loads(client.post('/libros/bulk', data=json.dumps(data), content_type='application/json').data)['resultados']]
+
+    sugerencias = json.loads(client.get('/libros/autocompletar?prefix=ci').data)
+    assert [s['texto'] for s in sugerencias] == ["Cien años de soledad", "Ciudades de papel"]
+
+    # Sin tildes, y cada autor aparece una sola vez
+    sugerencias = json.loads(client.get('/libros/autocompletar?prefix=gabriel garcia').data)
+    assert sugerencias == [{'texto': 'Gabriel García Márquez', 'campo': 'autor'}]
+
+    libro = {"titulo": "Cinco semanas en globo", "autor": "Julio Verne", "isbn": "9780000000204"}
+    nuevo = json.loads(client.post('/libros', data=json.dumps(libro), content_type='application/json').data)
+    client.put(f'/libros/{ids[0]}', data=json.dumps({"titulo": "El otoño del patriarca"}), content_type='application/json')
+    client.delete(f'/libros/{ids[2]}')
+
+    sugerencias = json.loads(client.get('/libros/autocompletar?prefix=ci&limit=5').data)
+    assert sugerencias == [{'texto': 'Cinco semanas en globo', 'campo': 'titulo', 'id': nuevo['id']}]
+    assert client.get('/libros/autocompletar').status_code == 400
+    assert client.get('/libros/autocompletar?prefix=ci&limit=0').status_code == 400
+    assert client.get('/libros/autocompletar?prefix=ci&limit=-3').status_code == 400
+
+
+# ============= PRUEBAS DEL MAPA DE DISPONIBILIDAD =============
+
+def esperar_reconstruccion(app):
+    # El mapa se reconstruye en otro hilo, que tiene tomado este lock hasta terminar
+    with app.extensions['disponibilidad_reconstruyendo']:
+        pass
+
+def test_conteo_y_descarte_sin_consultas(client, sample_usuario, sample_libro):
+    """Test 20: /libros/disponibles/count y el descarte de préstamos usan el mapa de bits en memoria"""
+    # Sin mapa todavía: se cuenta en la BD y el mapa se construye en segundo plano
+    assert json.loads(client.get('/libros/disponibles/count').data) == {'disponibles': 1}
+    esperar_reconstruccion(client.application)
+
+    data = {"usuario_id": sample_usuario.id, "libro_id": sample_libro.id}
+    assert client.post('/prestamos', data=json.dumps(data), content_type='application/json').status_code == 201
+
+    # La escritura propia mantiene la copia al día: ni el conteo ni el descarte consultan la BD
+    response, consultas = contar_consultas(client.application, lambda: client.get('/libros/disponibles/count'))
+    assert json.loads(response.data) == {'disponibles': 0}
+    assert consultas == 0
+
+    response, consultas = contar_consultas(
+        client.application,
+        lambda: client.post('/prestamos', data=json.dumps(data), content_type='application/json'))
+    assert response.status_code == 400
+    assert consultas == 0
+
+    response, consultas = contar_consultas(
+        client.application,
+        lambda: client.post('/prestamos', data=json.dumps({"usuario_id": sample_usuario.id, "libro_id": 999999}),
+                            content_type='application/json'))
+    assert response.status_code == 404
+    assert consultas == 0
+
+    # Una escritura que no pasa por este proceso desfasa la copia y se reconcilia con la BD
+    from app.cache import cache
+    with client.application.app_context():
+        db.session.get(Libro, sample_libro.id).disponible = True
+        db.session.commit()
+        cache.invalidar('libros')
+    assert json.loads(client.get('/libros/disponibles/count').data) == {'disponibles': 1}
+
+def test_mapa_sin_version_no_descarta(app, client, sample_usuario):
+    """Test 37: con la versión ilegible (backend caído) no se confía en el mapa: ni para contar ni para rechazar préstamos"""
+    with app.app_context():
+        libro = Libro(titulo='Prestado', autor='Autor', isbn='9780000000371', disponible=False)
+        db.session.add(libro)
+        db.session.commit()
+        libro_id = libro.id
+
+    backend = app.extensions['cache']
+    app.extensions['cache'] = BackendCaido()
+    try:
+        assert json.loads(client.get('/libros/disponibles/count').data) == {'disponibles': 0}
+        esperar_reconstruccion(app)
+        # Otro proceso lo devuelve, pero no puede avisar: la versión compartida no se puede leer
+        with app.app_context():
+            db.session.get(Libro, libro_id).disponible = True
+            db.session.commit()
+        assert json.loads(client.get('/libros/disponibles/count').data) == {'disponibles': 1}
+        data = {"usuario_id": sample_usuario.id, "libro_id": libro_id}
+        assert client.post('/prestamos', data=json.dumps(data), content_type='application/json').status_code == 201
+    finally:
+        app.extensions['cache'] = backend
+
+
+# ============= PRUEBAS DE INSTRUMENTACIÓN =============
+
+def test_server_timing_y_metrics(client, sample_libro):
+    """Test 21: cada respuesta trae Server-Timing y /metrics expone latencias, consultas, pool y cache"""
+    response = client.get(f'/libros/{sample_libro.id}')
+    assert response.status_code == 200
+    fases = {parte.split(';')[0].strip() for parte in response.headers['Server-Timing'].split(',')}
+    assert fases == {'db', 'serializacion', 'json', 'total'}
+    assert '1 consultas' in response.headers['Server-Timing']
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    texto = response.data.decode()
+    assert 'http_request_duration_seconds_bucket{route="/libros/<int:id>",method="GET",le="+Inf"}' in texto
+    assert 'db_queries_total{route="/libros/<int:id>",method="GET"}' in texto
+    assert 'db_pool_checkouts_total' in texto
+    assert 'cache_misses_total' in texto
+
+def test_metrics_suma_workers_y_cuenta_500(sample_libro, tmp_path):
+    """Test 38: con METRICAS_DIR /metrics suma los volcados de todos los workers y cuenta las excepciones como 500"""
+    from app import create_app
+    from app.metricas import metricas, retirar_proceso
+    from config import TestConfig
+
+    class MultiprocesoConfig(TestConfig):
+        METRICAS_DIR = str(tmp_path)
+
+    app = create_app(MultiprocesoConfig)
+
+    @app.route('/falla')
+    def falla():
+        raise RuntimeError('falla')
+
+    cliente = app.test_client()
+    with pytest.raises(RuntimeError):
+        cliente.get('/falla')
+    assert cliente.get(f'/libros/{sample_libro.id}').status_code == 200
+
+    # Lo que volcó otro worker (pid 999999) se suma a lo de este
+    with app.app_context():
+        otro = app.extensions['metricas']
+        app.extensions['metricas'] = {}
+        cliente.get(f'/libros/{sample_libro.id}')
+        (tmp_path / '999999.json').write_text(json.dumps(metricas.instantanea()))
+        app.extensions['metricas'] = otro
+
+    texto = cliente.get('/metrics').data.decode()
+    assert 'http_requests_total{route="/falla",method="GET",status="500"} 1' in texto
+    assert 'http_requests_total{route="/libros/<int:id>",method="GET",status="200"} 2' in texto
+    assert 'db_pool_en_uso{pid="999999"}' in texto
+
+    # Al terminar el worker sus contadores pasan al acumulado: los totales no retroceden
+    retirar_proceso(str(tmp_path), 999999)
+    assert not (tmp_path / '999999.json').exists()
+    texto = cliente.get('/metrics').data.decode()
+    assert 'http_requests_total{route="/libros/<int:id>",method="GET",status="200"} 2' in texto
+    assert 'db_pool_en_uso{pid="999999"}' not in texto
+
+
+# ============= PRUEBAS DEL PRESUPUESTO DE CONSULTAS =============
+# Con TestConfig (PRESUPUESTO_ESTRICTO) cada petición de estas pruebas ya verifica el presupuesto de su ruta
+
+def test_todas_las_rutas_tienen_presupuesto(app):
+    """Test 22: cada endpoint declara su máximo de consultas con @presupuesto"""
+    sin_presupuesto = [endpoint for endpoint, vista in app.view_functions.items()
+                       if endpoint.startswith('main.') and not hasattr(vista, 'presupuesto_consultas')]
+    assert sin_presupuesto == []
+
+def test_eliminar_usuario_dentro_del_presupuesto(client, sample_usuario):
+    """Test 23: DELETE /usuarios/<id> (cargar, revisar préstamos y borrar) no excede su presupuesto"""
+    response = client.delete(f'/usuarios/{sample_usuario.id}')
+    assert response.status_code == 200
+    assert client.get(f'/usuarios/{sample_usuario.id}').status_code == 404
+
+def test_detecta_n_mas_1(sample_usuario):
+    """Test 24: una ruta que recorre relaciones sin joinedload lanza PresupuestoExcedido en pruebas"""
+    from flask import jsonify
+    from app import create_app
+    from app.presupuesto import PresupuestoExcedido, presupuesto
+    from config import TestConfig
+
+    app = create_app(TestConfig)
+
+    @app.route('/prestamos-sin-join')
+    @presupuesto(10)
+    def prestamos_sin_join():
+        return jsonify([prestamo.to_dict() for prestamo in Prestamo.query.all()])
+
+    with app.app_context():
+        for i in range(3):
+            libro = Libro(titulo=f'N+1 {i}', autor='Autor', isbn=f'n1{i:011d}')
+            db.session.add(libro)
+            db.session.add(Prestamo(usuario_id=sample_usuario.id, libro=libro))
+        db.session.commit()
+
+    # 1 consulta de préstamos + 1 por libro (el usuario queda en el identity map tras la primera)
+    with pytest.raises(PresupuestoExcedido, match='N\\+1'):
+        app.test_client().get('/prestamos-sin-join')
+
+
+# ============= PRUEBAS DE SERIALIZACIÓN =============
+
+def test_serializadores_equivalen_a_to_dict(app, sample_usuario, sample_libro):
+    """Test 25: con cualquiera de los proveedores JSON, los serializadores producen el mismo JSON que to_dict()"""
+    from app.serializacion import SERIALIZADORES, JSONProviderEstandar, JSONProviderRapido
+
+    with app.app_context():
+        prestamo = Prestamo(usuario_id=sample_usuario.id, libro_id=sample_libro.id)
+        db.session.add(prestamo)
+        db.session.commit()
+        prestamo.fecha_devolucion = prestamo.fecha_prestamo # Cubre las dos fechas
+        for obj in (db.session.get(Usuario, sample_usuario.id), db.session.get(Libro, sample_libro.id), prestamo):
+            for proveedor in (JSONProviderEstandar(app), JSONProviderRapido(app)):
+                serializado = proveedor.dumps(SERIALIZADORES[type(obj)].objeto(obj))
+                assert json.loads(serializado) == obj.to_dict()
+        db.session.rollback()
+
+
+# ============= PRUEBAS DE ?fields= =============
+
+def test_fields_en_listados(client, sample_usuario, sample_libro):
+    """Test 26: ?fields= devuelve solo esas claves en lista completa, paginada, streaming y búsqueda, y valida los nombres"""
+    response = client.get('/libros?fields=id,titulo')
+    assert json.loads(response.data) == [{'id': sample_libro.id, 'titulo': sample_libro.titulo}]
+
+    # Paginada sin pedir id: el cursor sigue funcionando
+    otro = client.post('/libros', data=json.dumps({"titulo": "Otro", "autor": "Autor", "isbn": "9990001112223"}),
+                       content_type='application/json')
+    pagina = json.loads(client.get('/libros?fields=titulo&limit=1').data)
+    assert pagina['items'] == [{'titulo': sample_libro.titulo}]
+    assert pagina['next_cursor'] == sample_libro.id
+    pagina = json.loads(client.get(f'/libros?fields=titulo&limit=1&after={pagina["next_cursor"]}').data)
+    assert pagina == {'items': [{'titulo': 'Otro'}], 'next_cursor': None}
+
+    lineas = client.get('/libros?fields=isbn', headers={'Accept': 'application/x-ndjson'}).data.decode().splitlines()
+    assert [json.loads(linea) for linea in lineas] == [{'isbn': sample_libro.isbn}, {'isbn': '9990001112223'}]
+
+    # También en la búsqueda de texto
+    response = client.get('/libros/buscar?q=Test&fields=titulo,autor')
+    assert json.loads(response.data) == [{'titulo': 'Test Book', 'autor': 'Test Author'}]
+    assert client.get('/libros/buscar?q=Test&fields=id,clave').status_code == 400
+
+    # Campos de otra tabla en préstamos (JOIN solo con la tabla necesaria)
+    data = {"usuario_id": sample_usuario.id, "libro_id": json.loads(otro.data)['id']}
+    client.post('/prestamos', data=json.dumps(data), content_type='application/json')
+    prestamos = json.loads(client.get('/prestamos?fields=libro_titulo,activo').data)
+    assert prestamos == [{'libro_titulo': 'Otro', 'activo': True}]
+    response = client.get('/prestamos?fields=libro_titulo&limit=2')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'items': [{'libro_titulo': 'Otro'}], 'next_cursor': None}
+
+    response = client.get('/usuarios?fields=id,password')
+    assert response.status_code == 400
+    assert 'password' in json.loads(response.data)['error']
+    assert client.get('/libros?fields=,').status_code == 400
+
+
+# ============= PRUEBAS DE LECTURA CON CORE =============
+
+def test_lectura_core_igual_a_orm(client, sample_usuario, sample_libro):
+    """Test 27: con LECTURA_CORE las lecturas devuelven lo mismo que por el ORM, en todas las rutas o solo en algunas"""
+    from app import create_app
+    from config import TestConfig
+
+    class CoreConfig(TestConfig):
+        LECTURA_CORE = True
+
+    class CoreLibrosConfig(TestConfig):
+        LECTURA_CORE = {'main.obtener_libros'}
+
+    data = {"usuario_id": sample_usuario.id, "libro_id": sample_libro.id}
+    prestamo = json.loads(client.post('/prestamos', data=json.dumps(data), content_type='application/json').data)
+    client.put(f'/prestamos/{prestamo["id"]}/devolver') # fecha_devolucion con valor
+
+    urls = ['/usuarios', f'/usuarios/{sample_usuario.id}', '/libros', '/libros?limit=1', f'/libros/{sample_libro.id}',
+            '/libros/disponibles', '/libros/buscar?q=Test', '/prestamos', '/prestamos?limit=1', f'/prestamos/{prestamo["id"]}',
+            '/libros/999999']
+    for config_class in (CoreConfig, CoreLibrosConfig):
+        core = create_app(config_class).test_client()
+        for url in urls:
+            esperado, obtenido = client.get(url), core.get(url)
+            assert obtenido.status_code == esperado.status_code, url
+            assert json.loads(obtenido.data) == json.loads(esperado.data), url
+
+
+# ============= PRUEBAS DE DEVOLUCIÓN EN LOTE =============
+
+def test_devolver_en_lote(client, sample_usuario):
+    """Test 28: PUT /prestamos/devolver cierra préstamos por id o ISBN y reporta el resultado de cada elemento"""
+    libros = [json.loads(client.post('/libros', data=json.dumps({"titulo": f"Lote {i}", "autor": "Autor", "isbn": f"777000000000{i}"}),
+                                     content_type='application/json').data) for i in range(4)]
+    prestamos = [json.loads(client.post('/prestamos', data=json.dumps({"usuario_id": sample_usuario.id, "libro_id": libro['id']}),
+                                        content_type='application/json').data) for libro in libros[:3]]
+    client.put(f'/prestamos/{prestamos[2]["id"]}/devolver')
+
+    lote = [prestamos[0]['id'], libros[1]['isbn'], prestamos[2]['id'], libros[3]['isbn'], '0000000000000',
+            999999, prestamos[0]['id'], True]
+    response = client.put('/prestamos/devolver', data=json.dumps(lote), content_type='application/json')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['devueltos'] == 2
+    assert data['resultados'] == [
+        {'indice': 0, 'prestamo_id': prestamos[0]['id'], 'libro_id': libros[0]['id']},
+        {'indice': 1, 'prestamo_id': prestamos[1]['id'], 'libro_id': libros[1]['id']},
+        {'indice': 2, 'error': 'Este préstamo ya fue devuelto'},
+        {'indice': 3, 'error': 'El libro no tiene un préstamo activo'},
+        {'indice': 4, 'error': 'Libro no encontrado'},
+        {'indice': 5, 'error': 'Préstamo no encontrado'},
+        {'indice': 6, 'error': 'Préstamo repetido en el lote'},
+        {'indice': 7, 'error': 'Se espera un id de préstamo o un ISBN'},
+    ]
+    assert all(libro['disponible'] for libro in json.loads(client.get('/libros').data))
+    assert json.loads(client.get('/libros/disponibles/count').data) == {'disponibles': 4}
+
+    # Nada que devolver: 400 con el detalle
+    response = client.put('/prestamos/devolver', data=json.dumps([prestamos[0]['id']]), content_type='application/json')
+    assert response.status_code == 400
+    assert client.put('/prestamos/devolver', data=json.dumps({}), content_type='application/json').status_code == 400
+
+
+# ============= PRUEBAS DE PRÉSTAMOS VENCIDOS =============
+
+def test_prestamos_vencidos(app, client, sample_usuario):
+    """Test 29: el préstamo fija fecha_vencimiento y /prestamos/vencidos pagina los vencidos con sus días de atraso"""
+    from datetime import datetime, timedelta
+
+    ids = []
+    for i in range(4):
+        libro = json.loads(client.post('/libros', data=json.dumps({"titulo": f"Vence {i}", "autor": "Autor", "isbn": f"666000000000{i}"}),
+                                       content_type='application/json').data)
+        prestamo = json.loads(client.post('/prestamos', data=json.dumps({"usuario_id": sample_usuario.id, "libro_id": libro['id']}),
+                                          content_type='application/json').data)
+        ids.append(prestamo['id'])
+    prestado = datetime.fromisoformat(prestamo['fecha_prestamo'])
+    assert datetime.fromisoformat(prestamo['fecha_vencimiento']) - prestado == timedelta(days=app.config['DIAS_PRESTAMO'])
+
+    # Vencidos hace 10, 3 y 3 días; el último sigue vigente
+    ahora = datetime.utcnow()
+    with app.app_context():
+        for id, vencimiento in zip(ids, [ahora - timedelta(days=3, hours=1), ahora - timedelta(days=10, hours=1),
+                                         ahora - timedelta(days=3, hours=1), ahora + timedelta(days=1)]):
+            db.session.get(Prestamo, id).fecha_vencimiento = vencimiento
+        db.session.commit()
+    client.put(f'/prestamos/{ids[2]}/devolver') # Devuelto: ya no cuenta aunque esté vencido
+
+    pagina = json.loads(client.get('/prestamos/vencidos?limit=1').data)
+    assert [(p['id'], p['dias_atraso']) for p in pagina['items']] == [(ids[1], 10)]
+    assert pagina['items'][0]['usuario_nombre'] == sample_usuario.nombre
+    assert pagina['items'][0]['libro_titulo'] == 'Vence 1'
+    pagina = json.loads(client.get(f'/prestamos/vencidos?limit=1&after={pagina["next_cursor"]}').data)
+    assert [(p['id'], p['dias_atraso']) for p in pagina['items']] == [(ids[0], 3)]
+    assert pagina['next_cursor'] is None
+
+    assert client.get('/prestamos/vencidos?after=ayer').status_code == 400
+
+
+# ============= PRUEBAS DE ESTADÍSTICAS =============
+
+def test_estadisticas_de_circulacion(client, sample_usuario):
+    """Test 30: préstamos y devoluciones (individuales y en lote) actualizan las estadísticas en la misma transacción"""
+    from datetime import datetime
+
+    otro = json.loads(client.post('/usuarios', data=json.dumps({"nombre": "Otro", "email": "otro_estadisticas@test.com"}),
+                                  content_type='application/json').data)
+    libros = [json.loads(client.post('/libros', data=json.dumps({"titulo": f"Popular {i}", "autor": "Autor", "isbn": f"555000000000{i}"}),
+                                     content_type='application/json').data) for i in range(2)]
+
+    def prestar(usuario_id, libro_id):
+        return json.loads(client.post('/prestamos', data=json.dumps({"usuario_id": usuario_id, "libro_id": libro_id}),
+                                      content_type='application/json').data)['id']
+
+    # Libro 0: tres préstamos; libro 1: uno
+    client.put(f'/prestamos/{prestar(sample_usuario.id, libros[0]["id"])}/devolver')
+    client.put(f'/prestamos/{prestar(otro["id"], libros[0]["id"])}/devolver')
+    pendientes = [prestar(sample_usuario.id, libros[0]['id']), prestar(sample_usuario.id, libros[1]['id'])]
+    client.put('/prestamos/devolver', data=json.dumps(pendientes), content_type='application/json')
+
+    assert json.loads(client.get('/estadisticas/libros?limit=1').data) == [
+        {'libro_id': libros[0]['id'], 'titulo': 'Popular 0', 'autor': 'Autor', 'prestamos': 3}]
+    assert json.loads(client.get('/estadisticas/usuarios').data) == [
+        {'usuario_id': sample_usuario.id, 'nombre': sample_usuario.nombre, 'prestamos': 3},
+        {'usuario_id': otro['id'], 'nombre': 'Otro', 'prestamos': 1}]
+    hoy = datetime.utcnow().date().isoformat()
+    assert json.loads(client.get(f'/estadisticas/diarias?desde={hoy}&hasta={hoy}').data) == [
+        {'dia': hoy, 'prestamos': 4, 'devoluciones': 4}]
+
+    resumen = json.loads(client.get('/estadisticas').data)
+    assert [libro['prestamos'] for libro in resumen['libros']] == [3, 1]
+    assert resumen['por_dia'] == [{'dia': hoy, 'prestamos': 4, 'devoluciones': 4}]
+
+    assert client.get('/estadisticas/diarias?desde=2020-01-01&hasta=2026-01-01').status_code == 400
+    assert client.get('/estadisticas/libros?limit=x').status_code == 400
+
+
+# ============= PRUEBAS DE CONTADORES DE PRÉSTAMOS =============
+
+def test_contadores_de_prestamos(app, client, sample_usuario):
+    """Test 31: préstamos y devoluciones mantienen prestamos_activos y total_prestamos, que limitan los préstamos activos"""
+    from sqlalchemy import update
+    from app.cli import reconciliar_contadores
+
+    libros = [json.loads(client.post('/libros', data=json.dumps({"titulo": f"Contado {i}", "autor": "Autor", "isbn": f"444000000000{i}"}),
+                                     content_type='application/json').data) for i in range(4)]
+
+    def prestar(libro_id):
+        return client.post('/prestamos', data=json.dumps({"usuario_id": sample_usuario.id, "libro_id": libro_id}),
+                           content_type='application/json')
+
+    def contadores(url):
+        datos = json.loads(client.get(url).data)
+        return datos['prestamos_activos'], datos['total_prestamos']
+
+    prestamos = [json.loads(prestar(libro['id']).data)['id'] for libro in libros[:3]]
+    client.put(f'/prestamos/{prestamos[0]}/devolver')
+    client.put('/prestamos/devolver', data=json.dumps(prestamos[1:]), content_type='application/json')
+    prestamos.append(json.loads(prestar(libros[0]['id']).data)['id'])
+    assert contadores(f'/usuarios/{sample_usuario.id}') == (1, 4)
+    assert contadores(f'/libros/{libros[0]["id"]}') == (1, 2)
+    assert contadores(f'/libros/{libros[1]["id"]}') == (0, 1)
+
+    # El máximo se valida con el contador, dentro del UPDATE que lo incrementa
+    app.config['MAX_PRESTAMOS_ACTIVOS'] = 2
+    try:
+        assert prestar(libros[1]['id']).status_code == 201
+        response = prestar(libros[2]['id'])
+        assert response.status_code == 400
+        assert 'préstamos activos' in json.loads(response.data)['error']
+        assert contadores(f'/libros/{libros[2]["id"]}') == (0, 1) # El rechazo no tocó ningún contador
+    finally:
+        app.config['MAX_PRESTAMOS_ACTIVOS'] = 0
+    assert contadores(f'/usuarios/{sample_usuario.id}') == (2, 5)
+
+    # Un desfase (p. ej. una escritura fuera de la API) se corrige con `flask reconciliar-contadores`
+    with app.app_context():
+        db.session.execute(update(Usuario).values(prestamos_activos=0, total_prestamos=0))
+        db.session.commit()
+        assert reconciliar_contadores() == {'usuarios': 1, 'libros': 0}
+    assert contadores(f'/usuarios/{sample_usuario.id}') == (2, 5)
+    assert 'usuarios: 0 filas corregidas' in app.test_cli_runner().invoke(args=['reconciliar-contadores']).output
+
+
+# ============= PRUEBAS DE ARCHIVO DE PRÉSTAMOS =============
+
+def test_archivo_de_prestamos(app, client, sample_usuario):
+    """Test 32: los préstamos devueltos antiguos pasan a prestamos_archivados y se leen con ?incluir_historial=1"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import update
+    from app.archivo import archivar
+    from app.cli import reconciliar_contadores
+
+    libros = [json.loads(client.post('/libros', data=json.dumps({"titulo": f"Archivo {i}", "autor": "Autor", "isbn": f"333000000000{i}"}),
+                                     content_type='application/json').data) for i in range(3)]
+    ids = [json.loads(client.post('/prestamos', data=json.dumps({"usuario_id": sample_usuario.id, "libro_id": libro['id']}),
+                                  content_type='application/json').data)['id'] for libro in libros]
+    client.put('/prestamos/devolver', data=json.dumps(ids[:2]), content_type='application/json')
+    with app.app_context():
+        # El primero se devolvió hace 400 días, el segundo hoy; el tercero sigue activo
+        db.session.execute(update(Prestamo).where(Prestamo.id == ids[0]).values(fecha_devolucion=datetime.utcnow() - timedelta(days=400)))
+        db.session.commit()
+        assert archivar(dias=365, lote=1) == 1
+        assert archivar(dias=365, lote=1) == 0
+        assert reconciliar_contadores() == {'usuarios': 0, 'libros': 0} # Los archivados siguen en total_prestamos
+
+    result = app.test_cli_runner().invoke(args=['archivar-prestamos', '--dias', '365'])
+    assert '0 préstamos archivados' in result.output
+
+    assert [p['id'] for p in json.loads(client.get('/prestamos').data)] == ids[1:]
+    assert client.get(f'/prestamos/{ids[0]}').status_code == 404
+
+    historial = json.loads(client.get('/prestamos?incluir_historial=1').data)
+    assert [(p['id'], p['activo']) for p in historial] == [(ids[0], False), (ids[1], False), (ids[2], True)]
+    assert historial[0]['libro_titulo'] == 'Archivo 0'
+    assert historial[0].keys() == json.loads(client.get(f'/prestamos/{ids[1]}').data).keys()
+    assert json.loads(client.get(f'/prestamos/{ids[0]}?incluir_historial=1').data) == historial[0]
+
+    pagina = json.loads(client.get('/prestamos?incluir_historial=1&limit=2&fields=id,usuario_nombre').data)
+    assert pagina == {'items': [{'id': ids[0], 'usuario_nombre': sample_usuario.nombre}, {'id': ids[1], 'usuario_nombre': sample_usuario.nombre}],
+                      'next_cursor': ids[1]}
+    pagina = json.loads(client.get(f'/prestamos?incluir_historial=1&limit=2&after={ids[1]}&fields=id').data)
+    assert pagina == {'items': [{'id': ids[2]}], 'next_cursor': None}
+    assert client.get('/prestamos?incluir_historial=1&fields=clave').status_code == 400
+
+
+# ============= PRUEBAS DE COMMIT AGRUPADO =============
+
+def test_commit_agrupado(app, client, sample_usuario, sample_libro):
+    """Test 33: con COMMIT_AGRUPADO las escrituras concurrentes comparten un commit y cada una recibe su resultado"""
+    import threading
+    from app.commit_agrupado import commit_agrupado
+
+    def en_paralelo(peticiones):
+        resultados = [None] * len(peticiones)
+        def enviar(i, url, datos):
+            response = app.test_client().post(url, data=json.dumps(datos), content_type='application/json')
+            resultados[i] = (response.status_code, json.loads(response.data))
+        hilos = [threading.Thread(target=enviar, args=(i, *peticion)) for i, peticion in enumerate(peticiones)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    app.config.update(COMMIT_AGRUPADO=True, COMMIT_AGRUPADO_ESPERA_MS=50)
+    try:
+        with app.app_context():
+            antes = commit_agrupado.estadisticas()
+
+        # Dos pedidos con el mismo email en el mismo lote: el segundo ve el alta del primero
+        usuarios = en_paralelo([('/usuarios', {"nombre": f"Grupo {i}", "email": f"grupo{i % 5}@test.com"}) for i in range(8)])
+        assert sorted(status for status, _ in usuarios) == [201] * 5 + [400] * 3
+        assert len({cuerpo['id'] for status, cuerpo in usuarios if status == 201}) == 5
+
+        # Préstamos que compiten por el mismo libro: uno gana, el resto se deshace en su savepoint
+        prestamos = en_paralelo([('/prestamos', {"usuario_id": sample_usuario.id, "libro_id": sample_libro.id})] * 4 +
+                                [('/prestamos', {"usuario_id": 999999, "libro_id": sample_libro.id})])
+        assert sorted(status for status, _ in prestamos) == [201, 400, 400, 400, 404]
+
+        with app.app_context():
+            despues = commit_agrupado.estadisticas()
+            assert despues['trabajos'] - antes['trabajos'] == 13
+            assert despues['lotes'] - antes['lotes'] < 13 # Al menos dos peticiones compartieron commit
+
+            # Una excepción en un trabajo solo afecta a su petición
+            def falla():
+                db.session.add(Usuario(nombre='Duplicado', email='grupo0@test.com')) # Viola el UNIQUE de email
+                db.session.flush()
+            with pytest.raises(Exception):
+                commit_agrupado.ejecutar(falla)
+    finally:
+        app.config.update(COMMIT_AGRUPADO=False)
+
+    assert client.get(f'/libros/{sample_libro.id}').get_json()['disponible'] is False
+    usuario = client.get(f'/usuarios/{sample_usuario.id}').get_json()
+    assert (usuario['prestamos_activos'], usuario['total_prestamos']) == (1, 1)
+    assert len(client.get('/usuarios').get_json()) == 6
+
+def test_commit_agrupado_sobrevive_fallos_y_no_espera_para_siempre(app, client, monkeypatch):
+    """Test 39: si el lote falla antes de ejecutar los trabajos el hilo sigue vivo, y una espera larga responde 503 sin aplicar nada"""
+    import threading
+    import time
+    import sqlalchemy
+    from app import commit_agrupado as modulo
+    from app.commit_agrupado import commit_agrupado
+
+    app.config.update(COMMIT_AGRUPADO=True, COMMIT_AGRUPADO_ESPERA_MS=1, COMMIT_AGRUPADO_TIMEOUT=0.2)
+    try:
+        # El BEGIN del lote falla (como un "database is locked"): la petición recibe el error, no un TypeError del hilo
+        monkeypatch.setattr(modulo, 'text', lambda sql: sqlalchemy.text('BEGIN NO_EXISTE'))
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            client.post('/usuarios', data=json.dumps({"nombre": "Uno", "email": "uno@test.com"}), content_type='application/json')
+        monkeypatch.undo()
+        response = client.post('/usuarios', data=json.dumps({"nombre": "Dos", "email": "dos@test.com"}), content_type='application/json')
+        assert response.status_code == 201
+
+        # Un lote lento: el trabajo que llega detrás no entra a tiempo y se cancela
+        ejecutados = []
+        def lento():
+            time.sleep(0.5)
+            return {}, 200
+        def rapido():
+            ejecutados.append(True)
+            return {}, 200
+        def en_otro_hilo():
+            with app.app_context():
+                commit_agrupado.ejecutar(lento)
+        with app.app_context():
+            hilo = threading.Thread(target=en_otro_hilo)
+            hilo.start()
+            time.sleep(0.05)
+            assert commit_agrupado.ejecutar(rapido)[1] == 503
+            hilo.join()
+            assert commit_agrupado.ejecutar(rapido)[1] == 200
+        assert ejecutados == [True] # El cancelado nunca se ejecutó
+    finally:
+        app.config.update(COMMIT_AGRUPADO=False)
@@ -0,0 +1,47 @@
+# tests/rendimiento/test_autocompletar.py
+# Tiempo de construcción, memoria y latencia del índice de autocompletado (app/autocompletar.py)
+import os
+import random
+import time
+import tracemalloc
+
+from app.autocompletar import IndicePrefijos
+
+TITULOS = int(os.environ.get('BENCH_FILAS', 1_000_000))
+PALABRAS = ['historia', 'amor', 'guerra', 'ciudad', 'noche', 'mar', 'tiempo', 'sombra', 'jardín', 'río',
+            'canción', 'viaje', 'silencio', 'memoria', 'fuego', 'casa', 'luz', 'camino', 'sueño', 'años']
+
+def generar_titulos(n):
+    aleatorio = random.Random(42)
+    return [(f"{' '.join(aleatorio.choices(PALABRAS, k=3)).capitalize()} {i}", i) for i in range(n)]
+
+def test_construccion_y_memoria_por_millon():
+    """Construir el índice de títulos: segundos y MB por millón de títulos"""
+    entradas = generar_titulos(TITULOS)
+
+    inicio = time.perf_counter()
+    IndicePrefijos(entradas)
+    segundos = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    indice = IndicePrefijos(entradas)
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    escala = 1_000_000 / TITULOS
+    print(f'\nconstrucción: {segundos * escala:.2f} s por millón de títulos, '
+          f'memoria: {memoria * escala / 1024 / 1024:.0f} MB por millón de títulos')
+    assert len(indice) == TITULOS
+
+def test_latencia_busqueda_por_prefijo():
+    """Una búsqueda por prefijo sobre TITULOS títulos tarda menos de un milisegundo"""
+    indice = IndicePrefijos(generar_titulos(TITULOS))
+
+    inicio = time.perf_counter()
+    for prefijo in ['hist', 'amor g', 'cancion', 'sueño mar', 'x']:
+        for _ in range(200):
+            indice.buscar(prefijo, 10)
+    por_busqueda_ms = (time.perf_counter() - inicio) / 1000 * 1000
+
+    print(f'\nbúsqueda por prefijo: {por_busqueda_ms * 1000:.1f} µs')
+    assert por_busqueda_ms < 1
@@ -0,0 +1,66 @@
+# tests/rendimiento/test_commit_agrupado.py
+# Compara altas por segundo (POST /usuarios y POST /prestamos) con un commit por petición y con
+# COMMIT_AGRUPADO, con varios hilos escribiendo a la vez en un mismo worker.
+# La carga completa contra gunicorn: tests/carga-estres/locustfile_pico.py
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import create_app
+from app.models import db, Usuario
+from config import TestConfig
+
+HILOS = 16
+PETICIONES_POR_HILO = 25
+
+class CommitPorPeticionConfig(TestConfig):
+    PRESUPUESTO_ESTRICTO = False
+    COMMIT_AGRUPADO = False
+
+class CommitAgrupadoConfig(CommitPorPeticionConfig):
+    COMMIT_AGRUPADO = True
+
+def altas_por_segundo(config_class):
+    app = create_app(config_class)
+    with app.app_context():
+        db.create_all()
+        usuario = Usuario(nombre='Lector', email=f'lector{uuid.uuid4().hex}@test.com')
+        db.session.add(usuario)
+        db.session.commit()
+        usuario_id = usuario.id
+
+    # Un libro por cada préstamo (1 de cada 4 peticiones), creados antes de medir
+    por_hilo = len(range(0, PETICIONES_POR_HILO, 4))
+    libros = [{'titulo': 'Libro', 'autor': 'Autor', 'isbn': uuid.uuid4().hex[:13]} for _ in range(HILOS * por_hilo)]
+    respuesta = app.test_client().post('/libros/bulk', json=libros).get_json()
+    ids = [libro['id'] for libro in respuesta['resultados']]
+
+    def trabajador(hilo):
+        cliente = app.test_client()
+        libros_del_hilo = iter(ids[hilo * por_hilo:(hilo + 1) * por_hilo])
+        for i in range(PETICIONES_POR_HILO):
+            if i % 4:
+                datos = {'nombre': 'Registro', 'email': f'{uuid.uuid4().hex}@test.com'}
+                assert cliente.post('/usuarios', json=datos).status_code == 201
+            else:
+                libro_id = next(libros_del_hilo)
+                assert cliente.post('/prestamos', json={'usuario_id': usuario_id, 'libro_id': libro_id}).status_code == 201
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HILOS) as executor:
+        list(executor.map(trabajador, range(HILOS)))
+    duracion = time.perf_counter() - inicio
+
+    with app.app_context():
+        db.engine.dispose()
+    return HILOS * PETICIONES_POR_HILO / duracion
+
+def test_commit_agrupado_vs_por_peticion():
+    """Con escrituras concurrentes, COMMIT_AGRUPADO da al menos el throughput de un commit por petición"""
+    por_peticion = altas_por_segundo(CommitPorPeticionConfig)
+    agrupado = altas_por_segundo(CommitAgrupadoConfig)
+    print(f'\ncommit por petición: {por_peticion:.0f} altas/s, commit agrupado: {agrupado:.0f} altas/s '
+          f'({agrupado / por_peticion:.2f}x, {HILOS} hilos)')
+    assert agrupado >= por_peticion * 0.9
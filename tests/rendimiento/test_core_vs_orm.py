@@ -0,0 +1,94 @@
+# tests/rendimiento/test_core_vs_orm.py
+# Throughput y memoria de los listados por el ORM (objetos db.Model) contra LECTURA_CORE (filas de select())
+# con distintos tamaños de tabla. Tamaños configurables: BENCH_TAMANOS=1000,10000,100000
+import os
+import statistics
+import time
+import tracemalloc
+
+import pytest
+from sqlalchemy import insert
+
+from app import create_app
+from app.cache import cache
+from app.models import db, Usuario, Libro, Prestamo
+from config import TestConfig
+
+TAMANOS = [int(t) for t in os.environ.get('BENCH_TAMANOS', '1000,10000,100000').split(',')]
+USUARIOS = 1000
+LOTE = 50_000
+REPETICIONES = 5
+
+class OrmConfig(TestConfig):
+    LECTURA_CORE = False
+
+class CoreConfig(TestConfig):
+    LECTURA_CORE = True
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Reemplaza el clean_db de tests/conftest.py: cada tamaño carga sus propios datos"""
+    yield
+
+def vaciar():
+    db.session.query(Prestamo).delete()
+    db.session.query(Libro).delete()
+    db.session.query(Usuario).delete()
+    db.session.commit()
+
+@pytest.fixture(scope='module', params=TAMANOS)
+def filas(app, request):
+    """request.param libros y un préstamo por libro"""
+    tamano = request.param
+    with app.app_context():
+        db.create_all()
+        vaciar()
+        db.session.execute(insert(Usuario), [
+            {'id': i, 'nombre': f'Usuario {i}', 'email': f'core{i}@test.com'} for i in range(1, USUARIOS + 1)
+        ])
+        for inicio in range(1, tamano + 1, LOTE):
+            ids = range(inicio, min(inicio + LOTE, tamano + 1))
+            db.session.execute(insert(Libro), [
+                {'id': i, 'titulo': f'Libro {i}', 'autor': f'Autor {i % 500}', 'isbn': f'{i:013d}'} for i in ids
+            ])
+            db.session.execute(insert(Prestamo), [{'usuario_id': i % USUARIOS + 1, 'libro_id': i} for i in ids])
+        db.session.commit()
+        yield tamano
+        vaciar()
+
+@pytest.fixture(scope='module')
+def apps():
+    return {'orm': create_app(OrmConfig), 'core': create_app(CoreConfig)}
+
+def medir(app, url):
+    """(mediana en ms, pico de memoria en MB) de la petición, sin cache de respuestas"""
+    cliente = app.test_client()
+
+    def peticion():
+        with app.app_context():
+            cache.invalidar('libros', 'prestamos')
+        assert cliente.get(url).status_code == 200
+
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        peticion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    peticion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(tiempos), pico / 1e6
+
+@pytest.mark.parametrize('url', ['/libros', '/prestamos'])
+def test_core_vs_orm(apps, filas, url):
+    """Con LECTURA_CORE el listado completo procesa más filas por segundo y ocupa menos memoria"""
+    resultados = {modo: medir(app, url) for modo, app in apps.items()}
+
+    print(f'\nGET {url} con {filas} filas:')
+    for modo, (ms, mb) in resultados.items():
+        print(f'  {modo:>4}: {ms:8.1f} ms, {filas / ms * 1000:10.0f} filas/s, pico {mb:6.1f} MB')
+    if filas >= 10_000: # Con tablas chicas domina el costo fijo de la petición
+        assert resultados['core'][0] < resultados['orm'][0]
+        assert resultados['core'][1] < resultados['orm'][1]
@@ -0,0 +1,28 @@
+# tests/rendimiento/test_disponibilidad.py
+# Memoria y velocidad del mapa de bits de app/disponibilidad.py con un catálogo grande
+# Tamaño configurable: BENCH_IDS=10000000 pytest tests/rendimiento/test_disponibilidad.py
+import os
+import time
+
+from app.disponibilidad import MapaBits
+
+IDS = int(os.environ.get('BENCH_IDS', 10_000_000))
+
+def test_memoria_y_consulta_mapa_bits():
+    """Con IDS ids el mapa ocupa ~IDS/8 bytes y cada consulta de pertenencia es O(1)"""
+    mapa = MapaBits()
+    inicio = time.perf_counter()
+    for i in range(0, IDS, 10): # 10% de los libros disponibles
+        mapa.poner(i, True)
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    encontrados = sum(1 for i in range(0, IDS, 997) if i in mapa)
+    consultas = len(range(0, IDS, 997))
+    por_consulta_us = (time.perf_counter() - inicio) / consultas * 1e6
+
+    memoria_mb = len(mapa.bytes) / 1e6
+    print(f'\n{IDS} ids: {memoria_mb:.2f} MB, carga {carga:.2f} s, {por_consulta_us:.3f} µs por consulta')
+    assert len(mapa) == len(range(0, IDS, 10))
+    assert encontrados == sum(1 for i in range(0, IDS, 997) if i % 10 == 0)
+    assert len(mapa.bytes) <= IDS // 8 * 1.5 + 1 # Holgura del crecimiento
@@ -215,6 +215,68 @@ def test_multiples_consultas_performance(benchmark, client):
     # Verificar que todas las consultas fueron exitosas
     assert all(r.status_code == 200 for r in resultados)
 
+# ============= PRUEBAS DE PERFORMANCE DE CREACIÓN EN LOTE =============
+
+def test_crear_libros_bulk_performance(benchmark, client):
+    """Medir rendimiento de POST /libros/bulk con 1000 libros por petición."""
+    lotes = iter(range(1000))
+
+    def crear_lote():
+        n = next(lotes)
+        data = [{"titulo": f"Libro {i}", "autor": "Autor Bulk", "isbn": f"7{n:05d}{i:07d}"} for i in range(1000)]
+        return client.post('/libros/bulk',
+                          data=json.dumps(data),
+                          content_type='application/json')
+
+    result = benchmark(crear_lote)
+    assert result.status_code == 201
+    assert json.loads(result.data)['creados'] == 1000
+
+def test_bulk_vs_individual_throughput(client):
+    """Comparar libros/segundo: N POST /libros contra un POST /libros/bulk."""
+    import time
+    n = 300
+
+    inicio = time.perf_counter()
+    for i in range(n):
+        data = {"titulo": f"Individual {i}", "autor": "Autor", "isbn": f"5{i:012d}"}
+        client.post('/libros', data=json.dumps(data), content_type='application/json')
+    individual = n / (time.perf_counter() - inicio)
+
+    data = [{"titulo": f"Lote {i}", "autor": "Autor", "isbn": f"6{i:012d}"} for i in range(n)]
+    inicio = time.perf_counter()
+    response = client.post('/libros/bulk', data=json.dumps(data), content_type='application/json')
+    lote = n / (time.perf_counter() - inicio)
+
+    assert response.status_code == 201
+    print(f"\nindividual: {individual:.0f} libros/s, bulk: {lote:.0f} libros/s ({lote / individual:.1f}x)")
+    assert lote >= 10 * individual
+
+def test_devolucion_lote_vs_individual_throughput(client):
+    """Comparar devoluciones/segundo: N PUT /prestamos/<id>/devolver contra un PUT /prestamos/devolver."""
+    import time
+    n = 300
+
+    usuario = json.loads(client.post('/usuarios', data=json.dumps({"nombre": "Lector", "email": "lote@test.com"}),
+                                     content_type='application/json').data)
+    libros = [{"titulo": f"Devolución {i}", "autor": "Autor", "isbn": f"8{i:012d}"} for i in range(2 * n)]
+    ids = [r['id'] for r in json.loads(client.post('/libros/bulk', data=json.dumps(libros), content_type='application/json').data)['resultados']]
+    prestamos = [json.loads(client.post('/prestamos', data=json.dumps({"usuario_id": usuario['id'], "libro_id": id}),
+                                        content_type='application/json').data)['id'] for id in ids]
+
+    inicio = time.perf_counter()
+    for prestamo_id in prestamos[:n]:
+        client.put(f'/prestamos/{prestamo_id}/devolver')
+    individual = n / (time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    response = client.put('/prestamos/devolver', data=json.dumps(prestamos[n:]), content_type='application/json')
+    lote = n / (time.perf_counter() - inicio)
+
+    assert json.loads(response.data)['devueltos'] == n
+    print(f"\nindividual: {individual:.0f} devoluciones/s, lote: {lote:.0f} devoluciones/s ({lote / individual:.1f}x)")
+    assert lote >= 10 * individual
+
 # ============= CONFIGURACIÓN DE BENCHMARK =============
 
 # Configuración personalizada para pytest-benchmark
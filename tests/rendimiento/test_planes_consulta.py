@@ -0,0 +1,157 @@
+# tests/rendimiento/test_planes_consulta.py
+# Verifica que las consultas frecuentes usen los índices de app/models.py (y de migrations/versions/0002)
+# sobre una tabla grande, para detectar regresiones en los planes de consulta.
+# Tamaño configurable: BENCH_FILAS=100000 pytest tests/rendimiento/test_planes_consulta.py
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, text
+
+from app.models import db, Usuario, Libro, Prestamo, PrestamoArchivado, EstadisticaLibro
+from app import estadisticas
+from app.busqueda import consulta_busqueda
+from app.vencidos import consulta_vencidos
+from app.archivo import consulta_con_historial
+
+FILAS = int(os.environ.get('BENCH_FILAS', 1_000_000))
+USUARIOS = 10_000
+LOTE = 50_000
+LATENCIA_MAXIMA_MS = 50
+AHORA = datetime.utcnow()
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Reemplaza el clean_db de tests/conftest.py: los datos se cargan una vez por módulo"""
+    yield
+
+@pytest.fixture(scope='module')
+def datos(app):
+    """Carga FILAS libros (10% disponibles), un préstamo por libro (activo si no está disponible) y FILAS / 2 archivados"""
+    with app.app_context():
+        db.create_all() # Este módulo reemplaza clean_db, que es quien recrea las tablas
+        db.session.query(EstadisticaLibro).delete()
+        db.session.query(PrestamoArchivado).delete()
+        db.session.query(Prestamo).delete()
+        db.session.query(Libro).delete()
+        db.session.query(Usuario).delete()
+
+        db.session.execute(insert(Usuario), [
+            {'id': i, 'nombre': f'Usuario {i}', 'email': f'plan{i}@test.com'} for i in range(1, USUARIOS + 1)
+        ])
+        for inicio in range(1, FILAS + 1, LOTE):
+            ids = range(inicio, min(inicio + LOTE, FILAS + 1))
+            db.session.execute(insert(Libro), [
+                {'id': i, 'titulo': f'Libro {i}', 'autor': f'Autor {i % 5000}', 'isbn': f'{i:013d}', 'disponible': i % 10 == 0}
+                for i in ids
+            ])
+            db.session.execute(insert(Prestamo), [
+                {'usuario_id': i % USUARIOS + 1, 'libro_id': i, 'activo': i % 10 != 0,
+                 'fecha_vencimiento': AHORA + timedelta(days=i % 60 - 30, seconds=i)} for i in ids # La mitad vencidos
+            ])
+            db.session.execute(insert(EstadisticaLibro), [{'libro_id': i, 'prestamos': i % 997} for i in ids])
+            db.session.execute(insert(PrestamoArchivado), [ # Historial archivado: ids después de los de prestamos
+                {'id': FILAS + i, 'usuario_id': i % USUARIOS + 1, 'libro_id': i, 'fecha_devolucion': AHORA - timedelta(days=400)}
+                for i in ids if i % 2
+            ])
+        db.session.commit()
+        db.session.execute(text('ANALYZE')) # Estadísticas actualizadas para el planificador
+        db.session.commit()
+
+        yield
+
+        db.session.query(EstadisticaLibro).delete()
+        db.session.query(PrestamoArchivado).delete()
+        db.session.query(Prestamo).delete()
+        db.session.query(Libro).delete()
+        db.session.query(Usuario).delete()
+        db.session.commit()
+
+def plan(query):
+    """Texto del plan de ejecución de la consulta, según el motor"""
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        filas = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return '\n'.join(fila[-1] for fila in filas)
+    return '\n'.join(fila[0] for fila in db.session.execute(text(f'EXPLAIN {sql}')).all())
+
+def latencia_ms(query, repeticiones=20):
+    """Mediana en milisegundos de ejecutar la consulta"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        db.session.execute(getattr(query, 'statement', query)).all()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+CONSULTAS = {
+    # GET /libros/disponibles paginado (keyset sobre id)
+    'libros_disponibles': (
+        lambda: Libro.query.filter_by(disponible=True).filter(Libro.id > FILAS // 2).order_by(Libro.id).limit(100),
+        ['ix_libros_disponibles'],
+    ),
+    # Préstamo activo de un libro
+    'prestamo_activo_por_libro': (
+        lambda: Prestamo.query.filter(Prestamo.libro_id == FILAS // 3, Prestamo.activo == True),
+        ['ix_prestamos_activos', 'ix_prestamos_libro_id'],
+    ),
+    # Préstamos de un usuario
+    'prestamos_por_usuario': (
+        lambda: Prestamo.query.filter(Prestamo.usuario_id == USUARIOS // 2),
+        ['ix_prestamos_usuario_id'],
+    ),
+    # GET /prestamos/vencidos: primera página y una página profunda (cursor a mitad del rango vencido)
+    'prestamos_vencidos': (
+        lambda: consulta_vencidos(AHORA, 101),
+        ['ix_prestamos_vencimiento'],
+    ),
+    'prestamos_vencidos_pagina_profunda': (
+        lambda: consulta_vencidos(AHORA, 101, (AHORA - timedelta(days=15), 0)),
+        ['ix_prestamos_vencimiento'],
+    ),
+    # GET /prestamos?incluir_historial=1&after= : el keyset llega a la llave primaria de cada lado del UNION ALL
+    'prestamos_con_historial': (
+        lambda: consulta_con_historial(('id', 'libro_titulo'), after=FILAS - 50, limit=101), # Página que cruza las dos tablas
+        ['INTEGER PRIMARY KEY', 'prestamos_pkey'],
+    ),
+    # GET /estadisticas/libros: top-N leído del índice de ranking, sin ordenar toda la tabla
+    'ranking_libros': (
+        lambda: estadisticas.top_libros(100),
+        ['ix_estadisticas_libros_ranking'],
+    ),
+    # GET /libros/buscar?q= (FTS5 en SQLite, GIN sobre tsvector en PostgreSQL)
+    'busqueda_texto': (
+        lambda: consulta_busqueda(str(FILAS // 7), 20),
+        ['ix_libros_busqueda', 'VIRTUAL TABLE INDEX'],
+    ),
+}
+
+@pytest.mark.parametrize('nombre', list(CONSULTAS))
+def test_plan_usa_indice(app, datos, nombre):
+    """El plan de cada consulta frecuente usa uno de los índices esperados"""
+    construir, indices = CONSULTAS[nombre]
+    with app.app_context():
+        texto = plan(construir())
+        assert any(indice in texto for indice in indices), f'{nombre} no usa {indices}:\n{texto}'
+
+@pytest.mark.parametrize('nombre', list(CONSULTAS))
+def test_latencia_consulta(app, datos, nombre):
+    """Cada consulta frecuente responde en menos de LATENCIA_MAXIMA_MS con FILAS filas"""
+    construir, _ = CONSULTAS[nombre]
+    with app.app_context():
+        mediana = latencia_ms(construir())
+        print(f'\n{nombre}: {mediana:.2f} ms (mediana, {FILAS} filas)')
+        assert mediana < LATENCIA_MAXIMA_MS
+
+@pytest.mark.parametrize('url', [
+    '/libros?limit=1000', '/libros/disponibles?limit=1000', '/usuarios?limit=1000',
+    '/prestamos?limit=1000', f'/prestamos/{FILAS // 2}', '/libros/buscar?q=Autor', '/estadisticas/libros?limit=100',
+    '/prestamos?incluir_historial=1&limit=1000',
+])
+def test_presupuesto_con_tabla_grande(app, datos, url):
+    """Con FILAS filas cada listado sigue dentro del presupuesto de su ruta (sin N+1 en páginas grandes)"""
+    # TestConfig tiene PRESUPUESTO_ESTRICTO: una ruta que exceda su @presupuesto lanza PresupuestoExcedido
+    assert app.test_client().get(url).status_code == 200
@@ -0,0 +1,68 @@
+# tests/rendimiento/test_pool_conexiones.py
+# Compara la latencia con el pool por defecto de SQLAlchemy y con un pool ajustado
+# (tamaño igual a la concurrencia, pre_ping y sentencias preparadas de psycopg)
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import create_app
+from app.models import db, Usuario
+from config import TestConfig, opciones_motor
+
+HILOS = 16
+PETICIONES_POR_HILO = 25
+
+class PoolPorDefectoConfig(TestConfig):
+    SQLALCHEMY_ENGINE_OPTIONS = {} # pool_size=5, max_overflow=10, sin pre_ping ni recycle
+
+class PoolAjustadoConfig(TestConfig):
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(TestConfig.SQLALCHEMY_DATABASE_URI)
+    if not TestConfig.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update({'pool_size': HILOS, 'max_overflow': 0})
+        if TestConfig.SQLALCHEMY_DATABASE_URI.startswith('postgresql+psycopg'):
+            SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {'prepare_threshold': 0}
+
+def medir(config_class):
+    app = create_app(config_class)
+    with app.app_context():
+        db.create_all()
+        if not Usuario.query.first():
+            db.session.add(Usuario(nombre='Usuario Pool', email='pool@test.com'))
+            db.session.commit()
+
+    def trabajador(_):
+        cliente = app.test_client()
+        tiempos = []
+        for _ in range(PETICIONES_POR_HILO):
+            inicio = time.perf_counter()
+            assert cliente.get('/usuarios').status_code == 200
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
+
+    with ThreadPoolExecutor(max_workers=HILOS) as executor:
+        tiempos = [t for lista in executor.map(trabajador, range(HILOS)) for t in lista]
+
+    with app.app_context():
+        metricas = app.extensions['pool_metricas'].to_dict()
+        db.engine.dispose()
+
+    tiempos.sort()
+    return {
+        'p50_ms': statistics.median(tiempos),
+        'p95_ms': tiempos[int(len(tiempos) * 0.95)],
+        'espera_max_ms': metricas['espera_max_ms'],
+        'conexiones_nuevas': metricas['conexiones_nuevas'],
+    }
+
+@pytest.mark.parametrize('nombre, config_class', [
+    ('por defecto', PoolPorDefectoConfig),
+    ('ajustado', PoolAjustadoConfig),
+])
+def test_latencia_segun_pool(nombre, config_class):
+    """Latencia de GET /usuarios con HILOS peticiones concurrentes"""
+    resultado = medir(config_class)
+    print(f"\npool {nombre}: p50={resultado['p50_ms']:.2f} ms p95={resultado['p95_ms']:.2f} ms "
+          f"espera_max={resultado['espera_max_ms']:.2f} ms conexiones={resultado['conexiones_nuevas']}")
+    assert resultado['conexiones_nuevas'] >= 1
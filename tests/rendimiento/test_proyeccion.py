@@ -0,0 +1,71 @@
+# tests/rendimiento/test_proyeccion.py
+# Latencia y memoria de GET /libros completo contra GET /libros?fields=id,titulo (proyección en SQL)
+# Tamaño configurable: BENCH_FILAS_JSON=100000 pytest -s tests/rendimiento/test_proyeccion.py
+import os
+import statistics
+import time
+import tracemalloc
+
+import pytest
+from sqlalchemy import insert
+
+from app.cache import cache
+from app.models import db, Libro
+
+FILAS = int(os.environ.get('BENCH_FILAS_JSON', 100_000))
+LOTE = 50_000
+REPETICIONES = 5
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Reemplaza el clean_db de tests/conftest.py: los datos se cargan una vez por módulo"""
+    yield
+
+@pytest.fixture(scope='module')
+def datos(app):
+    with app.app_context():
+        db.create_all()
+        db.session.query(Libro).delete()
+        for inicio in range(1, FILAS + 1, LOTE):
+            db.session.execute(insert(Libro), [
+                {'id': i, 'titulo': f'Libro número {i}', 'autor': f'Autor {i % 5000}', 'isbn': f'{i:013d}', 'disponible': i % 2 == 0}
+                for i in range(inicio, min(inicio + LOTE, FILAS + 1))
+            ])
+        db.session.commit()
+        yield
+        db.session.query(Libro).delete()
+        db.session.commit()
+
+def medir(app, url):
+    """(mediana en ms, pico de memoria en MB) de la petición, sin cache de respuestas"""
+    cliente = app.test_client()
+
+    def peticion():
+        with app.app_context():
+            cache.invalidar('libros')
+        response = cliente.get(url)
+        assert response.status_code == 200
+        return response
+
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        peticion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    peticion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(tiempos), pico / 1e6
+
+def test_fields_reduce_latencia_y_memoria(app, datos):
+    """?fields=id,titulo selecciona 2 columnas y no crea objetos Libro: menos tiempo y menos memoria"""
+    completo = medir(app, '/libros')
+    proyectado = medir(app, '/libros?fields=id,titulo')
+
+    print(f'\nGET /libros con {FILAS} filas (mediana de {REPETICIONES}, pico de memoria):')
+    print(f'  completo:          {completo[0]:.0f} ms, {completo[1]:.0f} MB')
+    print(f'  ?fields=id,titulo: {proyectado[0]:.0f} ms, {proyectado[1]:.0f} MB')
+    assert proyectado[0] < completo[0]
+    assert proyectado[1] < completo[1]
@@ -0,0 +1,90 @@
+# tests/rendimiento/test_serializacion.py
+# Compara la serialización de una respuesta grande de /libros: to_dict() + json estándar (camino anterior)
+# contra los serializadores precompilados + orjson de app/serializacion.py
+# Tamaño configurable: BENCH_FILAS_JSON=100000 pytest -s tests/rendimiento/test_serializacion.py
+import os
+import statistics
+import time
+
+import pytest
+from sqlalchemy import insert, select
+
+from app import create_app
+from app.cache import cache
+from app.models import db, Libro
+from app.serializacion import COLUMNAS, SERIALIZADORES, JSONProviderEstandar, JSONProviderRapido
+from config import TestConfig
+
+FILAS = int(os.environ.get('BENCH_FILAS_JSON', 100_000))
+LOTE = 50_000
+REPETICIONES = 5
+
+class EstandarConfig(TestConfig):
+    JSON_PROVIDER = 'estandar'
+
+class OrjsonConfig(TestConfig):
+    JSON_PROVIDER = 'orjson'
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Reemplaza el clean_db de tests/conftest.py: los datos se cargan una vez por módulo"""
+    yield
+
+@pytest.fixture(scope='module')
+def datos(app):
+    with app.app_context():
+        db.create_all()
+        db.session.query(Libro).delete()
+        for inicio in range(1, FILAS + 1, LOTE):
+            db.session.execute(insert(Libro), [
+                {'id': i, 'titulo': f'Libro número {i}', 'autor': f'Autor {i % 5000}', 'isbn': f'{i:013d}', 'disponible': i % 2 == 0}
+                for i in range(inicio, min(inicio + LOTE, FILAS + 1))
+            ])
+        db.session.commit()
+        yield
+        db.session.query(Libro).delete()
+        db.session.commit()
+
+def mediana_ms(funcion):
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+def test_serializacion_libros(app, datos):
+    """Solo serialización (objetos o filas ya cargados): to_dict + json estándar vs serializador + orjson"""
+    with app.app_context():
+        libros = Libro.query.all()
+        filas = db.session.execute(select(*COLUMNAS[Libro].values())).all()
+        estandar, rapido = JSONProviderEstandar(app), JSONProviderRapido(app)
+        caminos = {
+            'to_dict + json estándar': lambda: estandar.response([libro.to_dict() for libro in libros]),
+            'serializador + json estándar': lambda: estandar.response(SERIALIZADORES[Libro].objetos(libros)),
+            'serializador + orjson': lambda: rapido.response(SERIALIZADORES[Libro].objetos(libros)),
+            'filas de Core + serializador + orjson': lambda: rapido.response(SERIALIZADORES[Libro].filas(filas)),
+        }
+        tiempos = {nombre: mediana_ms(camino) for nombre, camino in caminos.items()}
+
+    print(f'\nSerialización de {FILAS} libros (mediana de {REPETICIONES}):')
+    for nombre, ms in tiempos.items():
+        print(f'  {nombre}: {ms:.0f} ms')
+    assert tiempos['serializador + orjson'] < tiempos['to_dict + json estándar']
+    assert tiempos['filas de Core + serializador + orjson'] < tiempos['serializador + orjson']
+
+@pytest.mark.parametrize('nombre, config_class', [('estandar', EstandarConfig), ('orjson', OrjsonConfig)])
+def test_respuesta_libros(datos, nombre, config_class):
+    """GET /libros completo con FILAS libros según JSON_PROVIDER (sin cache: se invalida en cada petición)"""
+    app = create_app(config_class)
+    cliente = app.test_client()
+
+    def peticion():
+        with app.app_context():
+            cache.invalidar('libros')
+        response = cliente.get('/libros')
+        assert response.status_code == 200
+        return response
+
+    ms = mediana_ms(peticion)
+    print(f'\nGET /libros ({FILAS} filas, {nombre}): {ms:.0f} ms; {peticion().headers["Server-Timing"]}')
@@ -107,6 +107,11 @@ def test_validacion_tipos_datos(client):
         # Debe rechazar tipos de datos incorrectos
         assert response.status_code in [400, 422, 404]
 
+    # true/false no son ids (en Python bool es subclase de int)
+    for data in [{"usuario_id": True, "libro_id": 1}, {"usuario_id": 1, "libro_id": True}]:
+        response = client.post('/prestamos', data=json.dumps(data), content_type='application/json')
+        assert response.status_code == 400
+
 def test_validacion_longitud_campos(client):
     """Test 6: Validación de longitud de campos"""
     # Nombre muy largo (más de 100 caracteres)